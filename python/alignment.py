@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Locate the part of a sentence that best matches a transcription without enumerating windows."""
+
+import numpy as np
+
+from similarity import Encoded, encode, codepoints, numWords, yieldQueryMasks, editDistances
+
+def locateSpans(query, candidates):
+   """
+   " For every candidate, find the substring with the smallest edit distance to the query.
+   " A forward semi-global pass (free gaps at both ends of the candidate) gives the best
+   " distance and where it ends. A second pass aligns the reversed query backwards from
+   " that end, and the shortest suffix reaching the same distance gives the start.
+   " Return arrays of starts, (exclusive) ends and distances in candidate offsets.
+   """
+   candidates = encode(candidates)
+   pattern = codepoints(query)
+   numCands = len(candidates)
+   if not len(pattern) or not numCands:
+      zeros = np.zeros(numCands, dtype=np.int64)
+      return zeros, zeros.copy(), np.full(numCands, len(pattern), dtype=np.int64)
+
+   words = numWords(len(pattern))
+   patternLengths = np.full(numCands, len(pattern), dtype=np.int64)
+
+   # Forward pass: best distance and the end of the span achieving it.
+   distances, ends = editDistances(yieldQueryMasks(pattern, candidates), patternLengths, words)
+
+   # Reverse each candidate's prefix up to its end.
+   width = candidates.codes.shape[1]
+   steps = np.arange(width)
+   source = ends[:, None] - 1 - steps[None, :]
+   valid = source >= 0
+   reversedCodes = np.where(
+      valid,
+      np.take_along_axis(candidates.codes, np.maximum(source, 0), axis=1),
+      -1
+   )
+   reversedPrefixes = Encoded(reversedCodes, ends)
+
+   # Backward pass: distance of the query to every suffix of the prefix.
+   _, _, history = editDistances(
+      yieldQueryMasks(pattern[::-1], reversedPrefixes),
+      patternLengths,
+      words,
+      freeStart=False,
+      keepAll=True
+   )
+   reached = (history == distances[:, None]) & valid
+   lengths = np.where(reached.any(axis=1), np.argmax(reached, axis=1) + 1, 0)
+   starts = ends - lengths
+
+   return starts, ends, distances
+
+def locateSpan(query, candidate):
+   """Return (start, end, distance) of the best matching substring of a single candidate."""
+   starts, ends, distances = locateSpans(query, [candidate])
+   return int(starts[0]), int(ends[0]), int(distances[0])
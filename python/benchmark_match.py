@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+" Measure the speed and accuracy of the matchers on transcriptions synthesized from a source text,
+" so that changes to the matching can be checked without running Julius.
+" Usage: python benchmark_match.py ../html/kokoro_natume_souseki.html -n 500
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+
+import numpy as np
+
+import readings
+import fuzzy_match
+import new_match
+from corpus_index import CorpusIndex
+
+dedupNewlines = re.compile(r"[\n]{2,}")
+kanji = re.compile(r"[一-鿿㐀-䶿々]")
+transcriptionPunctuation = re.compile(r"[\s、。「」『』（）！？!?・…―]+") # Julius outputs none of these.
+
+minChunk = 6 # Shortest synthesized transcription, in characters.
+maxChunk = 30 # Longest synthesized transcription, in characters.
+
+def stripHtml(htmlPath):
+   """Strip an Aozora Bunko HTML file the same way as xml_to_text.py."""
+   from bs4 import BeautifulSoup, UnicodeDammit
+
+   with open(htmlPath, "rb") as f:
+      mirepoix = UnicodeDammit(f.read(), ["shift-jis", "utf-8", "euc-jp"])
+   soup = BeautifulSoup(mirepoix.unicode_markup, "lxml")
+   main_text = soup.find_all("div", attrs={"class": "main_text"})[0]
+   for rpt in main_text(["rp", "rt"]):
+      rpt.decompose()
+   return re.sub(dedupNewlines, "\n", main_text.get_text().strip())
+
+def loadSource(path):
+   """Return the path of a stripped text, stripping it into a temporary file first if it is HTML."""
+   path = Path(path)
+   if path.suffix.lower() not in {".html", ".htm", ".xhtml"}:
+      return path
+   out = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+   with out:
+      out.write(stripHtml(path))
+   return Path(out.name)
+
+#####
+# Noise.
+#####
+
+def yieldMorphemes(text):
+   """Yield (surface, part of speech, reading) for every morpheme of a string."""
+   node = readings.tagger().parseToNode(text)
+   while node:
+      if node.surface:
+         fields = node.feature.split(",")
+         yomi = fields[7] if len(fields) > 7 and fields[7] != "*" else node.surface
+         yield node.surface, fields[0], yomi
+      node = node.next
+
+def katakanaToHiragana(s):
+   return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in s)
+
+def homophoneTable(text):
+   """Group the kanji-bearing morphemes of the text by reading."""
+   surfaces = defaultdict(set)
+   for surface, _, yomi in yieldMorphemes(text):
+      if kanji.search(surface):
+         surfaces[yomi].add(surface)
+   return {yomi: sorted(s) for yomi, s in surfaces.items()}
+
+def addNoise(chunk, homophones, rng, swapRate, dropRate):
+   """
+   " Make a chunk of text look like a Julius transcription: kanji words are swapped for a homophone
+   " (or spelt out in kana if there is none), particles (助詞) are dropped and punctuation is removed.
+   """
+   out = []
+   for surface, pos, yomi in yieldMorphemes(chunk):
+      if pos == "助詞" and rng.random() < dropRate:
+         continue
+      if kanji.search(surface) and rng.random() < swapRate:
+         others = [s for s in homophones.get(yomi, []) if s != surface]
+         surface = rng.choice(others) if others else katakanaToHiragana(yomi)
+      out.append(surface)
+   return transcriptionPunctuation.sub("", "".join(out))
+
+def synthesize(text, spans, count, rng, swapRate=0.2, dropRate=0.2, spanRate=0.2):
+   """
+   " Cut count chunks out of the text, in reading order, and add noise to them.
+   " A chunk usually lies inside one sentence, but with probability spanRate
+   " it runs on into the next one. Return (start, end, transcription) triples.
+   """
+   homophones = homophoneTable(text)
+   usable = [i for i, (s, e, _) in enumerate(spans) if e - s >= minChunk]
+   picks = sorted(rng.choice(usable) for _ in range(count))
+
+   samples = []
+   for i in picks:
+      start, end, _ = spans[i]
+      length = rng.randint(minChunk, maxChunk)
+      if rng.random() < spanRate and i + 1 < len(spans):
+         # Straddle the boundary with the next sentence.
+         a = max(start, end - length // 2)
+         b = min(spans[i + 1][1], a + length)
+      else:
+         a = rng.randint(start, max(start, end - length))
+         b = min(end, a + length)
+      transcription = addNoise(text[a:b], homophones, rng, swapRate, dropRate)
+      if transcription:
+         samples.append((a, b, transcription))
+   return samples
+
+#####
+# Matchers.
+#####
+
+def overlapping(offsets, a, b):
+   """Ids of the sentences whose offsets overlap [a, b)."""
+   return [i for i, (s, e) in enumerate(offsets) if s < b and a < e]
+
+def runFuzzy(textPath, text, samples):
+   """Time fuzzy_match.findBestMatch. A match is correct if it lies within the sentences the chunk was cut from."""
+   index = CorpusIndex.fromSpans(fuzzy_match.yieldSentenceSpans(textPath))
+   def judge(a, b, best):
+      ids = overlapping(index.offsets, a, b)
+      if not (best and ids):
+         return False
+      return best in text[index.offsets[ids[0]][0]:index.offsets[ids[-1]][1]]
+   return index, lambda t, _: fuzzy_match.findBestMatch(t, index), judge
+
+def runSentence(textPath, text, samples):
+   """Time new_match.sentenceLevelMatch. A match is correct if it is one of the sentences the chunk was cut from."""
+   index = CorpusIndex.fromSpans(new_match.splitStrippedText(textPath))
+   def judge(a, b, match):
+      return match[0] in overlapping(index.offsets, a, b)
+   numTrans = len(samples)
+   return index, lambda t, i: new_match.sentenceLevelMatch(t, i, numTrans, index), judge
+
+matchers = {
+   "fuzzy": runFuzzy,
+   "sentence": runSentence
+}
+
+def peakRss():
+   """Peak resident set size of this process so far, in MiB."""
+   peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+   return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+def benchmark(name, textPath, text, samples):
+   """Run one matcher over the samples and return its statistics."""
+   t0 = time.perf_counter()
+   index, match, judge = matchers[name](textPath, text, samples)
+   indexSeconds = time.perf_counter() - t0
+
+   latencies = []
+   correct = 0
+   for i, (a, b, transcription) in enumerate(samples):
+      t0 = time.perf_counter()
+      result = match(transcription, i)
+      latencies.append(time.perf_counter() - t0)
+      correct += judge(a, b, result)
+
+   latencies = np.array(latencies)
+   stats = {
+      "matcher": name,
+      "sentences": len(index),
+      "transcriptions": len(samples),
+      "indexSeconds": indexSeconds,
+      "sentencesPerSecond": len(samples) / latencies.sum() if latencies.sum() else 0.0,
+      "p50Ms": 1000 * float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+      "p99Ms": 1000 * float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+      "peakRssMiB": peakRss(),
+      "top1Accuracy": correct / len(samples) if len(samples) else 0.0
+   }
+   if name == "fuzzy":
+      stats["cascade"] = fuzzy_match.cascade.report()
+   return stats
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Benchmark the matchers on synthetic transcriptions.")
+   parser.add_argument("source", help="A stripped.txt, or an Aozora Bunko HTML file to strip first.")
+   parser.add_argument("-n", "--count", type=int, default=200, help="Number of transcriptions.")
+   parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed.")
+   parser.add_argument("--swap-rate", type=float, default=0.2, help="Chance of swapping a kanji word for a homophone.")
+   parser.add_argument("--drop-rate", type=float, default=0.2, help="Chance of dropping a particle.")
+   parser.add_argument("--span-rate", type=float, default=0.2, help="Chance of a chunk crossing a sentence boundary.")
+   parser.add_argument(
+      "-m", "--matchers",
+      nargs="+",
+      choices=sorted(matchers),
+      default=sorted(matchers),
+      help="Matchers to run."
+   )
+   parser.add_argument("--no-disk-cache", action="store_true", help="Don't use the on-disk reading cache.")
+   parser.add_argument("-o", "--output", help="Also write the results as JSON to this file.")
+   args = parser.parse_args()
+
+   if args.no_disk_cache:
+      readings.diskCachePath = None
+
+   textPath = loadSource(args.source)
+   try:
+      with textPath.open("r") as f:
+         text = f.read()
+
+      rng = random.Random(args.seed)
+      spans = list(fuzzy_match.yieldSentenceSpans(textPath))
+      samples = synthesize(text, spans, args.count, rng, args.swap_rate, args.drop_rate, args.span_rate)
+
+      results = []
+      for name in args.matchers:
+         stats = benchmark(name, textPath, text, samples)
+         results.append(stats)
+         print(
+            "{matcher:>10}: {transcriptions} transcriptions against {sentences} sentences (index {indexSeconds:.2f}s), "
+            "{sentencesPerSecond:.1f}/s, p50 {p50Ms:.1f}ms, p99 {p99Ms:.1f}ms, "
+            "peak RSS {peakRssMiB:.0f}MiB, top-1 {top1Accuracy:.3f}".format(**stats)
+         )
+         if "cascade" in stats:
+            print("{:>10}  cascade rejections of {considered}: {rejections}".format("", **stats["cascade"]))
+   finally:
+      # The matchers read the stripped text from its file, so it lives until they are all done.
+      if textPath != Path(args.source):
+         textPath.unlink()
+
+   if args.output:
+      with open(args.output, "w") as out:
+         json.dump(results, out, indent=3)
@@ -3,12 +3,16 @@
 """Connect to the running Julius server and process a batch of files."""
 
 import re
+import html
 import socket
-import sqlite3
-import lxml.etree as ET
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 from pathlib import Path
-from subprocess import run, Popen
+from subprocess import run
+
+import sqlite_writer
+from sqlite_writer import BatchWriter, MAX_DELAY
 
 ##############
 # CONSTANTS. #
@@ -16,128 +20,111 @@ from subprocess import run, Popen
 # Socket-related.
 HOST = "localhost"
 PORT = 10500
+CHUNK_SIZE = 1 << 16 # Bytes read from the socket at once.
+ENCODING = "utf-8" # Encoding of Julius's output.
+
+# Client-related.
+QUEUE_SIZE = 256 # Sentences of one server that may wait to be written before it is no longer read from.
+BATCH_SIZE = 500 # Most sentences written at once.
 
 # Tags/XML-related
-INPUT_TAG = '<INPUT STATUS="LISTEN" '
-RECOGOUT_TAG = 'RECOGOUT'
-SENT_HYPO_TAG = 'SHYPO'
-WORD_HYPO_TAG = 'WHYPO'
-START_TAG = '<' + RECOGOUT_TAG + '>\n'
-END_TAG = '</' + RECOGOUT_TAG + '>\n'
-# TAGS = [RECOGOUT_TAG, SENT_HYPO_TAG, WORD_HYPO_TAG]
+INPUT_TAG = b'<INPUT STATUS="LISTEN"' # Julius is waiting for the next file.
 
 ############
 # REGEXES. #
 ############
-# Helper regexes to escape angle brackets.
-startClassId = re.compile(r"\"<s>\"")
-endClassId = re.compile(r"\"</s>\"")
-
-#####################################
-# Functions for processing the XML. #
-#####################################
-# def startRecogMatch(line):
-#    """Helper function to match the beginning of a recognition out tag."""
-#    return True if line == START_TAG else False
-
-def endRecogMatch(line):
-   """Helper function to match the end of a recognition out tag."""
-   return True if line == END_TAG else False
-
-def escapeAngleBrackets(sentence):
-   """Helper function to escape angle brackets in attribute values of XML tags."""
-   return endClassId.sub(
-      '"&lt;/s&gt;"',
-      startClassId.sub(
-         '"&lt;s&gt;"',
-         sentence
-      )
-   )
+# Julius's output isn't well-formed XML (bare "." lines, CLASSID="<s>"), so the tags are found with byte regexes.
+# The regexes only look for what they need and skip over everything else, quirks included.
+recogOut = re.compile(rb"<RECOGOUT>(.*?)</RECOGOUT>", re.DOTALL)
+firstHypothesis = re.compile(rb"<SHYPO\s[^\n]*?\bRANK=\"1\"[^\n]*?>(.*?)</SHYPO>", re.DOTALL)
+wordHypothesis = re.compile(rb"<WHYPO\s[^\n]*?\bWORD=\"([^\"]*)\"")
+
+#########################################
+# Incremental parser for Julius output. #
+#########################################
+class JuliusParser:
+   """
+   " Parse the output of Julius in module mode as it comes in, in chunks of any size.
+   " Every file Julius processes starts with an INPUT STATUS="LISTEN" tag; feed() returns the sentence
+   " of every file completed by a chunk, i.e. the words of the rank 1 SHYPO of its first RECOGOUT joined
+   " together, or '' if it has none. The last file is only complete once close() is called.
+   " Only the file being received is kept, as bytes, and the regexes run over it in place.
+   """
 
-def deleteBadLines(sentence):
-   """Julius outputs lines with just a "." on them, which is not valid XML. Remove them."""
-   sList = [s for s in sentence.split('\n') if s not in [".", ""]]
-   return '\n'.join(sList)
-
-def fixXML(sentence):
-   """Apply some quick fixes to the XML so LXML can handle it."""
-   sentence = escapeAngleBrackets(sentence)
-   sentence = deleteBadLines(sentence)
-   return "<CHUNK>\n" + sentence + "\n</CHUNK>"
-
-def processSent(sentence):
-   """Process a recognized sentence and print it."""
-   if not sentence:
-      return ''
-   sentence = fixXML(sentence)
-   root = ET.fromstring(sentence)
-   recogs = root.findall(RECOGOUT_TAG)
-   if not recogs:
-      return ''
-   else:
-      sents = recogs[0].findall(SENT_HYPO_TAG)
-      if not sents:
+   def __init__(self, encoding=ENCODING):
+      self.encoding = encoding
+      self.buffer = bytearray()
+      self.start = None # Offset of the LISTEN tag of the current file in the buffer, if one was seen.
+      self.scanned = 0 # No LISTEN tag starts between start and this offset.
+
+   def sentence(self, start, end):
+      """The sentence of the file between the offsets start and end of the buffer."""
+      recog = recogOut.search(self.buffer, start, end)
+      if recog is None:
          return ''
-      else:
-         for sent in sents:
-            if sent.attrib["RANK"] == "1":
-               newSentence = ''.join(w.attrib["WORD"] for w in sent.findall(WORD_HYPO_TAG))
-               return newSentence
-
-########################################
-# Generator for yielding lines of XML. #
-########################################
-def yieldLines(port):
-   # Connect to the Julius server.
-   # Julius will start processing the files.
+      hypothesis = firstHypothesis.search(self.buffer, recog.start(1), recog.end(1))
+      if hypothesis is None:
+         return ''
+      words = wordHypothesis.findall(self.buffer, hypothesis.start(1), hypothesis.end(1))
+      sentence = b"".join(words).decode(self.encoding)
+      return html.unescape(sentence) if "&" in sentence else sentence
+
+   def feed(self, data):
+      """Add a chunk of output and return the sentences of the files it completes, in order."""
+      self.buffer += data
+      sentences = []
+      while True:
+         position = self.buffer.find(INPUT_TAG, self.scanned)
+         if position < 0:
+            break
+         if self.start is not None:
+            sentences.append(self.sentence(self.start, position))
+         self.start = position
+         self.scanned = position + len(INPUT_TAG)
+
+      # Drop the files done with, and anything before the first LISTEN tag, once per chunk.
+      done = len(self.buffer) if self.start is None else self.start
+      done = min(done, max(len(self.buffer) - len(INPUT_TAG) + 1, 0))
+      del self.buffer[:done]
+      if self.start is not None:
+         self.start -= done
+      # A tag may be cut in two by the end of the chunk.
+      self.scanned = max(len(self.buffer) - len(INPUT_TAG) + 1, self.scanned - done)
+      return sentences
+
+   def close(self):
+      """Return the sentence of the last file, if any, and reset the parser."""
+      sentences = [] if self.start is None else [self.sentence(self.start, len(self.buffer))]
+      self.__init__(self.encoding)
+      return sentences
+
+###################################
+# Reading output from the socket. #
+###################################
+def connect(port):
+   """Connect to the Julius server, retrying until it listens. Julius will start processing the files."""
    while True:
       try:
-         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-         s.connect((HOST, port))
+         s = socket.create_connection((HOST, port))
       except socket.error:
          print(f"Retrying socket at {HOST}:{port}.")
          sleep(5)
       else:
-         break
-
-   # Make a file for the XML to be written to.
-   s_write = s.makefile(mode='r')
-
-   # Yield lines as they come in over the connection.
-   for line in s_write:
-      yield(line)
+         return s
 
 ####################
 # MAIN GENERATORS. #
 ####################
 def yieldSentences(port):
-   """Iterate over the XML from the socket and yield processed sentences."""
-   lines = yieldLines(port)
-   flag = False
-   while True:
-      try:
-         if not flag:
-            line = next(lines)
-            flag = False
-      except StopIteration:
-         break
-      else:
-         if not line.startswith(INPUT_TAG):
-            continue
-         else:
-            # Scan through and add everything until next INPUT_TAG.
-            newSent = line
-            while True:
-               try:
-                  line = next(lines)
-                  if line.startswith(INPUT_TAG):
-                     flag = True
-                     break
-               except StopIteration:
-                  break
-               else:
-                  newSent += line
-            yield processSent(newSent)
+   """Read the output of a Julius server and yield the sentence of every file, in order."""
+   parser = JuliusParser()
+   with connect(port) as s:
+      while True:
+         data = s.recv(CHUNK_SIZE)
+         if not data:
+            break
+         yield from parser.feed(data)
+   yield from parser.close()
 
 def yieldFilepaths(path):
    """Look at filelist.txt and yield filepaths."""
@@ -149,59 +136,133 @@ def yieldFilepaths(path):
       for line in filelist:
          yield line.strip()
 
-def main(packedTuple):
-   command, port, filelist = packedTuple
+##########################
+# Saving transcriptions. #
+##########################
+def databasePath(filelist):
+   """Make a database for each work to avoid locked databases, named after the work's filelist."""
+   return Path("../data", Path(filelist).stem, "data.db").resolve()
 
-   # Start the Julius server.
-   Popen(command)
+def workDatabase(path):
+   """The database of the work a file of split_audio belongs to, for filelists mixing works."""
+   return (Path(path).parent.parent / "data.db").resolve()
 
-   # Give the server enough time to start.
-   sleep(10)
+def saveResults(writers, results):
+   """
+   " Save (database path, (file_path, julius_transcription)) results.
+   " writers keeps a BatchWriter for every database seen so far; the ones that waited long enough are flushed.
+   """
+   for dbPath, pair in results:
+      if dbPath not in writers:
+         writers[dbPath] = BatchWriter(sqlite_writer.connect(dbPath), ["julius_transcription"])
+      writers[dbPath].write(pair)
+   for writer in writers.values():
+      if writer.due():
+         writer.flush()
+
+def closeWriters(writers):
+   for writer in writers.values():
+      writer.close()
+      writer.conn.close()
+
+#########################################
+# Asynchronous client for many servers. #
+#########################################
+async def openConnection(port):
+   """Connect to the Julius server, retrying until it listens."""
+   while True:
+      try:
+         return await asyncio.open_connection(HOST, port)
+      except OSError:
+         print(f"Retrying socket at {HOST}:{port}.")
+         await asyncio.sleep(5)
 
-   # Read in the sentences.
-   sentences = yieldSentences(port)
+async def readSentences(port):
+   """
+   " Asynchronous counterpart of yieldSentences.
+   " The socket is only read when the next sentence is asked for, so a consumer that stops asking
+   " fills the stream's buffer, which stops reading from the socket and, in turn, Julius.
+   """
+   parser = JuliusParser()
+   reader, writer = await openConnection(port)
+   try:
+      while True:
+         data = await reader.read(CHUNK_SIZE)
+         if not data:
+            break
+         for sentence in parser.feed(data):
+            yield sentence
+   finally:
+      writer.close()
+   for sentence in parser.close():
+      yield sentence
 
-   # Generate the filenames.
+async def transcribe(port, filelist, results, queueSize=QUEUE_SIZE):
+   """
+   " Pair the sentences of one server with the files of its filelist and queue them for the writer.
+   " At most queueSize of them may be waiting to be written; the server isn't read from until some are.
+   """
+   dbPath = databasePath(filelist)
    files = yieldFilepaths(str(filelist))
+   pending = asyncio.Semaphore(queueSize)
+   async for sentence in readSentences(port):
+      path = next(files, None)
+      if path is None:
+         break
+      await pending.acquire()
+      results.put_nowait((pending, dbPath, (path, sentence)))
 
-   # Make a database for each work to avoid locked databases in multiprocessing.
-   dbPath = Path("../data", filelist.stem, "data.db")
-   with sqlite3.connect(str(dbPath.resolve())) as conn:
-
-      conn.execute(
-      """
-         CREATE TABLE IF NOT EXISTS file_transcriptions (
-            file_path text UNIQUE,
-            julius_transcription text,
-            best_matches text,
-            final_transcription text
-         );
-      """
-   )
-      for pair in zip(files, sentences):
-         print(pair)
+async def writeResults(results, batchSize=BATCH_SIZE):
+   """
+   " The one writer for every server: take what is queued, up to batchSize results at a time, until None.
+   " SQLite is written to from a single thread of its own so that the event loop keeps reading meanwhile.
+   " Every MAX_DELAY seconds without results, the buffered ones are written anyway.
+   """
+   loop = asyncio.get_running_loop()
+   writers = {}
+   with ThreadPoolExecutor(max_workers=1) as executor:
+      done = False
+      while not done:
          try:
-            conn.execute(
-               """
-                  INSERT INTO file_transcriptions (
-                     file_path,
-                     julius_transcription
-                  )
-                  VALUES (
-                     ?,
-                     ?
-                  )
-                  ;
-               """,
-               pair
-            )
-         except sqlite3.IntegrityError:
-            conn.execute(
-               """
-                  UPDATE file_transcriptions
-                  SET julius_transcription = ?
-                  WHERE file_path = ?
-                  ;
-               """,
-               tuple(reversed(pair))
-            )
+            batch = [await asyncio.wait_for(results.get(), MAX_DELAY)]
+         except asyncio.TimeoutError:
+            batch = []
+         while len(batch) < batchSize and not results.empty():
+            batch.append(results.get_nowait())
+         if batch and batch[-1] is None:
+            done = True
+            batch.pop()
+         await loop.run_in_executor(executor, saveResults, writers, [r[1:] for r in batch])
+         for pending, _, _ in batch:
+            pending.release()
+      await loop.run_in_executor(executor, closeWriters, writers)
+
+async def transcribeAll(jobs, queueSize=QUEUE_SIZE, batchSize=BATCH_SIZE, transcriber=transcribe):
+   """
+   " Read from the servers of every (port, filelist) job at once and save everything through one writer.
+   " transcriber(port, filelist, results, queueSize) reads one server, e.g. transcribe or a supervisor's.
+   " Return what it returned for every job, or the exception it raised: a job failing is reported
+   " and the others carry on. If the writer fails, the servers are no longer read from and its error is raised.
+   """
+   results = asyncio.Queue()
+   writer = asyncio.create_task(writeResults(results, batchSize))
+   readers = asyncio.gather(
+      *(transcriber(port, filelist, results, queueSize) for port, filelist in jobs),
+      return_exceptions=True
+   )
+   try:
+      await asyncio.wait([writer, readers], return_when=asyncio.FIRST_COMPLETED)
+   finally:
+      if not readers.done():
+         # The writer only stops early on an error, after which the readers would wait on it forever.
+         readers.cancel()
+         await asyncio.gather(readers, return_exceptions=True)
+      if not writer.done():
+         results.put_nowait(None)
+      await writer
+
+   outcomes = readers.result()
+   for (port, filelist), outcome in zip(jobs, outcomes):
+      if isinstance(outcome, BaseException):
+         print(f"Reading {filelist} from {HOST}:{port} failed: {outcome!r}")
+   return outcomes
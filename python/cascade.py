@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Reject candidates with cheap upper bounds on their scores before computing the exact (expensive) ones."""
+
+from collections import Counter
+
+import numpy as np
+
+from similarity import codepoints, partialRatios, combine
+
+# Every stage is "<bound>:<field>", applied in order. Exact stages missing from an order are run last.
+# The q-gram bounds ("qgram:surface", "qgram:yomi") rarely reject anything the multiset bounds let through.
+# Stages are ordered by measured rejections (benchmark_match.py on kokoro, -n 500, 25750 candidates):
+# multiset:surface 28 (multiset:yomi rejects 0 when run first), multiset:yomi 3313, partial:surface 9907,
+# partial:yomi 9026. A first stage rejects little since the other field is still bounded by 100 alone.
+defaultOrder = (
+   "multiset:surface",
+   "multiset:yomi",
+   "partial:surface",
+   "partial:yomi"
+)
+gramSize = 2 # q of the q-gram filter.
+charBuckets = 256 # Characters are counted in this many buckets.
+gramBuckets = 512 # q-grams are counted in this many buckets.
+slack = 1e-9 # Keeps rounding in the bounds from rejecting a score sitting exactly on the threshold.
+
+def grams(codes, q=gramSize):
+   """Encode the q-grams of codepoint rows as integers, -1 where a gram runs into the padding."""
+   codes = np.atleast_2d(codes).astype(np.int64)
+   width = codes.shape[1] - q + 1
+   if width <= 0:
+      return np.full((codes.shape[0], 0), -1, dtype=np.int64)
+   out = np.zeros((codes.shape[0], width), dtype=np.int64)
+   valid = np.ones((codes.shape[0], width), dtype=bool)
+   for k in range(q):
+      part = codes[:, k:k + width]
+      out = (out << 21) | np.maximum(part, 0)
+      valid &= part >= 0
+   return np.where(valid, out, -1)
+
+def bucketCounts(codes, buckets):
+   """Count the non-negative codes of every row in buckets (code % buckets), as a (rows, buckets) matrix."""
+   rows, cols = np.nonzero(codes >= 0)
+   flat = rows * buckets + codes[rows, cols] % buckets
+   counts = np.bincount(flat, minlength=codes.shape[0] * buckets).reshape(codes.shape[0], buckets)
+   # Counts never exceed the length of a string.
+   return counts.astype(np.uint16 if codes.shape[1] < (1 << 16) else np.uint32)
+
+class Profile:
+   """
+   " The strings of one field of a corpus along with how many of their characters and q-grams fall in each bucket.
+   " Sharing a bucket is necessary for two characters (or q-grams) to be equal, so any overlap counted
+   " through the buckets is at least the true overlap and the bounds derived from it stay valid.
+   """
+
+   def __init__(self, encoded):
+      self.encoded = encoded
+      self.chars = bucketCounts(encoded.codes, charBuckets)
+      self.grams = bucketCounts(grams(encoded.codes), gramBuckets)
+
+   def __len__(self):
+      return len(self.encoded)
+
+def multisetBounds(query, profile, ids):
+   """
+   " Upper bounds on the partial ratios from the overlap c of the character multisets.
+   " Every character of the shorter string (length s) that is not matched costs at least one edit,
+   " so d >= s - c and p = 100 * (1 - d / s) <= 100 * c / s.
+   """
+   text = codepoints(query)
+   shortest = np.minimum(profile.encoded.lengths[ids], len(text))
+   if not len(text):
+      return np.zeros(len(ids))
+   buckets, queryCounts = np.unique(text % charBuckets, return_counts=True)
+   overlap = np.minimum(profile.chars[np.ix_(ids, buckets)], queryCounts[None, :]).sum(axis=1)
+   return np.where(shortest > 0, np.minimum(100.0 * overlap / np.maximum(shortest, 1), 100.0), 0.0)
+
+def qgramBounds(query, profile, ids):
+   """
+   " Upper bounds on the partial ratios from the q-gram lemma. If the shorter string (length s)
+   " is within k edits of a substring of the longer one, at least s - q + 1 - k * q of its q-grams
+   " occur in the longer string. With c of them found, k >= ceil((s - q + 1 - c) / q)
+   " and p <= 100 * (1 - k / s).
+   """
+   q = gramSize
+   text = codepoints(query)
+   lengths = profile.encoded.lengths[ids]
+   shortest = np.minimum(lengths, len(text))
+   queryGrams = grams(text)[0] % gramBuckets
+   if not len(queryGrams):
+      # Too short for the lemma to say anything.
+      return np.where(shortest > 0, 100.0, 0.0)
+
+   # Grams of the query found in each candidate...
+   queryFound = (profile.grams[np.ix_(ids, queryGrams)] > 0).sum(axis=1)
+   # ... and grams of each candidate found in the query.
+   candidateFound = profile.grams[np.ix_(ids, np.unique(queryGrams))].sum(axis=1)
+   c = np.where(lengths <= len(text), candidateFound, queryFound)
+
+   k = np.maximum(np.ceil((shortest - q + 1 - c) / q), 0)
+   bounds = 100.0 * (1 - k / np.maximum(shortest, 1))
+   return np.where(shortest > 0, np.clip(bounds, 0.0, 100.0), 0.0)
+
+def exactScores(query, profile, ids):
+   """The partial ratios themselves."""
+   return partialRatios(query, profile.encoded.take(ids))
+
+bounds = {
+   "multiset": multisetBounds,
+   "qgram": qgramBounds,
+   "partial": exactScores
+}
+
+class Cascade:
+   """
+   " Find the candidates whose weighted mean of partial ratios, e.g. (p + 0.75 * q) / 175, reaches a threshold.
+   " Each field starts with an upper bound of 100, which the stages lower in turn, from cheap bounds
+   " to the exact scores. After every stage, candidates whose combined bound is below the threshold
+   " are rejected and no later stage looks at them. The rejections of every stage are counted.
+   """
+
+   def __init__(self, weights, threshold, order=defaultOrder):
+      self.fields = list(weights)
+      self.weights = [weights[f] for f in self.fields]
+      self.threshold = threshold
+      self.order = list(order)
+      for field in self.fields:
+         if "partial:" + field not in self.order:
+            self.order.append("partial:" + field)
+      for stage in self.order:
+         kind, field = stage.split(":")
+         if kind not in bounds or field not in self.fields:
+            raise ValueError("Unknown cascade stage " + stage)
+      self.considered = 0
+      self.rejections = Counter()
+
+   def __call__(self, queries, profiles, ids):
+      """
+      " Score the candidates ids given {field: query} and {field: Profile}.
+      " Return the candidates reaching the threshold, in the given order, and their combined scores.
+      """
+      alive = np.asarray(ids, dtype=np.int64)
+      upper = {f: np.full(len(alive), 100.0) for f in self.fields}
+      self.considered += len(alive)
+
+      for stage in self.order:
+         if not len(alive):
+            break
+         kind, field = stage.split(":")
+         stageBounds = bounds[kind](queries[field], profiles[field], alive)
+         if kind == "partial":
+            upper[field] = stageBounds
+         else:
+            upper[field] = np.minimum(upper[field], stageBounds)
+
+         combined = combine([upper[f] for f in self.fields], self.weights)
+         keep = combined >= self.threshold - slack
+         self.rejections[stage] += int((~keep).sum())
+         alive = alive[keep]
+         upper = {f: u[keep] for f, u in upper.items()}
+
+      # Every field has been scored exactly by now.
+      scores = combine([upper[f] for f in self.fields], self.weights)
+      keep = scores >= self.threshold
+      self.rejections[self.order[-1]] += int((~keep).sum())
+      return alive[keep], scores[keep]
+
+   def report(self):
+      """Number of candidates considered and rejected at each stage, in order."""
+      return {"considered": self.considered, "rejections": {s: self.rejections[s] for s in self.order}}
+
+   def reset(self):
+      self.considered = 0
+      self.rejections.clear()
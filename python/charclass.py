@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Classify characters through one lookup table, for single characters or whole arrays of codepoints at once."""
+
+import numpy as np
+
+from create_mappings import punctuationMapping
+
+# Classes are bit flags, so a character can belong to several (e.g. "!" is ASCII and punctuation).
+ASCII = 1 #  -\u007F.
+HIRAGANA = 2 # ぁ-ゖ.
+KATAKANA = 4 # ゠-ヿ.
+KANJI = 8 # 㐀-䶵, 一-鿋, 豈-頻 and 々.
+PUNCTUATION = 16 # Keys of create_mappings.punctuationMapping.
+WHITESPACE = 32 # str.isspace().
+KEPT = ASCII | HIRAGANA | KATAKANA | KANJI # What normalization keeps, unless it is punctuation.
+
+ranges = [
+   (ASCII, 0x0020, 0x007F),
+   (HIRAGANA, 0x3041, 0x3096),
+   (KATAKANA, 0x30A0, 0x30FF),
+   (KANJI, 0x3400, 0x4DB5),
+   (KANJI, 0x4E00, 0x9FCB),
+   (KANJI, 0xF900, 0xFA6A),
+   (KANJI, 0x3005, 0x3005)
+]
+
+def buildTable():
+   """The classes of every BMP character as a uint8 array indexed by codepoint."""
+   table = np.zeros(0x10000, dtype=np.uint8)
+   for cls, first, last in ranges:
+      table[first:last + 1] |= cls
+   bmp = np.fromiter((k for k in punctuationMapping if k < 0x10000), dtype=np.int64)
+   table[bmp] |= PUNCTUATION
+   spaces = [cp for cp in range(0x10000) if chr(cp).isspace()]
+   table[spaces] |= WHITESPACE
+   return table
+
+table = buildTable()
+# Only punctuation has a class above the BMP.
+astralPunctuation = np.array(sorted(k for k in punctuationMapping if k >= 0x10000), dtype=np.int64)
+
+def codepoints(s):
+   """Encode a string as a 1-D array of codepoints."""
+   return np.frombuffer(s.encode("utf-32-le"), dtype="<u4").astype(np.int64)
+
+def classify(codes):
+   """
+   " Return the classes of an array of codepoints, of any shape, as a uint8 array of the same shape.
+   " Negative codes (e.g. the padding of similarity.encode) have no class.
+   """
+   codes = np.asarray(codes, dtype=np.int64)
+   classes = table[np.clip(codes, 0, 0xFFFF)]
+   classes[(codes < 0) | (codes > 0xFFFF)] = 0
+   astral = codes > 0xFFFF
+   if astral.any():
+      classes[astral & np.isin(codes, astralPunctuation)] = PUNCTUATION
+   return classes
+
+def isClass(codes, classes):
+   """Whether each codepoint belongs to any of the classes (flags or'ed together)."""
+   return (classify(codes) & classes) != 0
+
+def filterCodes(codes, classes):
+   """Keep the codepoints of a 1-D array belonging to any of the classes."""
+   codes = np.asarray(codes, dtype=np.int64)
+   return codes[isClass(codes, classes)]
+
+def classOf(char):
+   """The classes of a single character."""
+   cp = ord(char)
+   if cp <= 0xFFFF:
+      return int(table[cp])
+   return PUNCTUATION if cp in punctuationMapping else 0
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build an index of the sentences of a work so that matching does not redo the same work per transcription."""
+
+from bisect import bisect_left, bisect_right
+
+from normalize import normalizeSentences
+from readings import morphemesMany
+from ngram_index import NgramIndex, rank
+from similarity import encode
+from cascade import Profile
+from phonetic_index import PhoneticIndex
+
+class CorpusIndex:
+   """
+   " The sentences of a single work, prepared once for matching.
+   " For every sentence we keep the raw text, the normalized surface form,
+   " the normalized reading (yomi) and its (start, end) character offsets
+   " in the source text. Sentences are referred to by their integer index.
+   " The reading is built morpheme by morpheme, so spans of the reading
+   " can be mapped back to spans of the sentence without parsing again, and
+   " normalization keeps the source index of every character of the surface form.
+   """
+
+   def __init__(self, sentences, offsets=None):
+      self.sentences = list(sentences)
+
+      # Without explicit offsets, assume the sentences are contiguous.
+      if offsets is None:
+         offsets = []
+         start = 0
+         for s in self.sentences:
+            offsets.append((start, start + len(s)))
+            start += len(s)
+      self.offsets = list(offsets)
+
+      if len(self.offsets) != len(self.sentences):
+         raise ValueError("Need exactly one pair of offsets per sentence.")
+
+      # Normalize and parse every sentence exactly once.
+      self.surfaces = []
+      self.surfaceSources = []
+      self.yomis = []
+      self.surfaceSpans = []
+      self.yomiBounds = []
+      normalized = normalizeSentences(self.sentences, offsets=True)
+      for (surface, sources), parsed in zip(normalized, morphemesMany(self.sentences)):
+         self.surfaces.append(surface)
+         self.surfaceSources.append(sources)
+         yomi, surfaceSpans, yomiBounds = parsed
+         self.yomis.append(yomi)
+         self.surfaceSpans.append(surfaceSpans)
+         self.yomiBounds.append(yomiBounds)
+
+      # Character n-gram lookups over both forms for retrieval.
+      self.surfaceGrams = NgramIndex(self.surfaces)
+      self.yomiGrams = NgramIndex(self.yomis)
+
+      # Mora n-gram lookups over the readings, for transcriptions with the wrong kanji.
+      self.phonetics = PhoneticIndex(self.yomis)
+
+      # Codepoint arrays for batch scoring.
+      self.encodedSurfaces = encode(self.surfaces)
+      self.encodedYomis = encode(self.yomis)
+
+      # Bucket counts for the bounds of the cascade, only built when needed.
+      self.profiles = {}
+
+   @classmethod
+   def fromSpans(cls, spans):
+      """Build the index from (start, end, sentence) triples."""
+      offsets = []
+      sentences = []
+      for start, end, s in spans:
+         offsets.append((start, end))
+         sentences.append(s)
+      return cls(sentences, offsets)
+
+   def __len__(self):
+      return len(self.sentences)
+
+   def __getitem__(self, i):
+      return self.sentences[i]
+
+   def ids(self):
+      """All sentence ids, in reading order."""
+      return range(len(self.sentences))
+
+   def shortlist(self, surface, yomi, limit=50):
+      """
+      " Return the ids of at most limit sentences sharing the most n-grams
+      " with the normalized surface form and reading of a query.
+      """
+      counts = self.surfaceGrams.counts(surface)
+      counts.update(self.yomiGrams.counts(yomi))
+      return [i for i, _ in rank(counts, limit)]
+
+   def soundsLike(self, yomi, limit=50):
+      """Return the ids of at most limit sentences whose readings share the most mora n-grams with yomi."""
+      return self.phonetics.shortlist(yomi, limit)
+
+   def profile(self, field):
+      """Return the cascade.Profile of the "surface" or "yomi" field."""
+      if field not in self.profiles:
+         encoded = {"surface": self.encodedSurfaces, "yomi": self.encodedYomis}[field]
+         self.profiles[field] = Profile(encoded)
+      return self.profiles[field]
+
+   def surfaceSpan(self, i, yomiStart, yomiEnd):
+      """
+      " Map a span of the reading of sentence i to the (start, end) offsets, in the raw sentence,
+      " of the morphemes it covers. The morpheme boundaries are found by bisection.
+      """
+      bounds = self.yomiBounds[i]
+      spans = self.surfaceSpans[i]
+      if not spans or yomiEnd <= yomiStart:
+         return 0, 0
+      first = min(max(bisect_right(bounds, yomiStart) - 1, 0), len(spans) - 1)
+      last = min(max(bisect_left(bounds, yomiEnd) - 1, first), len(spans) - 1)
+      return spans[first][0], spans[last][1]
+
+   def normalizedSpan(self, i, start, end):
+      """Map (start, end) offsets in the raw sentence i to offsets in its normalized surface form."""
+      sources = self.surfaceSources[i]
+      return bisect_left(sources, start), bisect_left(sources, end)
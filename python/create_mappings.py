@@ -1,24 +1,26 @@
 #!/usr/bin/local python3
 # -*- coding: utf-8 -*-
-"""Create efficient character mappings to help with normalization."""
+"""
+" Create efficient character mappings to help with normalization.
+" The mappings are generated once into mapping_tables.py, next to this file, and imported from there.
+" After changing a mapping, bump mappingsVersion and run `python create_mappings.py` to regenerate them.
+"""
 
 import re
 import string
-import pickle
-
+from pathlib import Path
 from itertools import chain
 
+mappingsVersion = 1 # Version of the mappings below, recorded in the generated module.
+tablesPath = Path(__file__).resolve().with_name("mapping_tables.py")
+
 ###########################################
 # Fullwidth ASCII to halfwidth ASCII map. #
 ###########################################
 
-try:
-   # Load the mapping.
-   with open('map_asciiFullToHalfMapping.pkl', 'rb') as in_mapping:
-      asciiFullToHalfMapping = pickle.load(in_mapping)
-except FileNotFoundError:
-   # Combine Unicode ranges to make a mapping from fullwidth to halfwidth.
-   asciiFullToHalfMapping = str.maketrans( # Make a mapping from the dictionary.
+def buildAsciiFullToHalfMapping():
+   """Combine Unicode ranges to make a mapping from fullwidth to halfwidth."""
+   return str.maketrans( # Make a mapping from the dictionary.
       dict( # Make a dictionary from the tuples.
          zip( # Make tuples from the corresponding characters.
             chain(
@@ -46,22 +48,13 @@ except FileNotFoundError:
       )
    )
 
-   # Save the mapping.
-   print(asciiFullToHalfMapping)
-   with open('map_asciiFullToHalfMapping.pkl', 'wb') as out_mapping:
-      pickle.dump(asciiFullToHalfMapping, out_mapping)
-
 #################################################
 # Halfwidth Japanese to fullwidth Japanese map. #
 #################################################
 
-try:
-   # Load the mapping.
-   with open('map_japHalfToFullMapping.pkl', 'rb') as in_mapping:
-      japHalfToFullMapping = pickle.load(in_mapping)
-except FileNotFoundError:
-   # Combine Unicode ranges to make a mapping from fullwidth to halfwidth.
-   japHalfToFullMapping = str.maketrans( # Make a mapping from the dictionary.
+def buildJapHalfToFullMapping():
+   """Combine Unicode ranges to make a mapping from halfwidth to fullwidth."""
+   return str.maketrans( # Make a mapping from the dictionary.
       dict( # Make a dictionary from the tuples.
          zip( # Make tuples from the corresponding characters.
             map( # Map the numerical values to characters.
@@ -92,11 +85,6 @@ except FileNotFoundError:
       )
    )
 
-   # Save the mapping.
-   print(japHalfToFullMapping)
-   with open('map_japHalfToFullMapping.pkl', 'wb') as out_mapping:
-      pickle.dump(japHalfToFullMapping, out_mapping)
-
 ###########################################################
 # Set of characters considered punctuation maps to space. #
 ###########################################################
@@ -106,10 +94,8 @@ except FileNotFoundError:
 # There are definitely duplicates below, so we use sets to get rid of them.
 # Most fonts can't represent all characters, so we use lots of escapes.
 # NB.: None of the characters here should overlap with whitespace.
-try:
-   with open("map_punctuationMapping.pkl", "rb") as mapping_in:
-      punctuationMapping = pickle.load(mapping_in)
-except FileNotFoundError:
+def buildPunctuationMapping():
+   """Map every character considered punctuation to a space."""
    punctuation = \
       set(string.punctuation) | \
       set("！＂＃＄％＆＇（）＊＋，－．／：；＜＝＞？＠［＼］＾＿｀｛｜｝～、。〃〈〉《》「」『』【】〔〕〖〗〘〙〚〛〜〝〞〟｟｠｡｢｣､･゠〰⦅⦆") | \
@@ -117,13 +103,8 @@ except FileNotFoundError:
       set(f"\u002E\u0964\u0589\u3002\u06d4\u2cf9\u0701\u1362\u166e\u1803\u2cfe\uA4ff\ua60e\ua6f3\u083d\u1b5f\u002c\u060c\u3001\u055d\u07f8\u1363\u1808\u14fe\ua60d\ua6f5\u1b5e\u003f\u037e\u00bf\u061f\u055e\u0706\u1367\u2cfa\u2cfb\ua60f\u16f7\U00011143\uaaf1\u0021\u00a1\u07f9\u1944\u00b7\U0001039f\U000103d0\U00012470\u1361\u1680\U0001091f\u0830\u2014\u2013\u2012\u2010\u2043\ufe63\uff0d\u058a\u1806\u003b\u0387\u061b\u1364\u16f6\u2024\u003a\u1365\ua6f4\u1b5d\u2026\ufe19\u0eaf\u00ab\u2039\u00bb\u203a\u201e\u201a\u201c\u201f\u2018\u201b\u201d\u2019\u0022") | \
       set(map(chr, chain(range(0x2010, 0x2028), range(0x2030, 0x205F)))) | \
       set(map(chr, range(0x2E00, 0x2E50)))
-   
-   print(list(sorted(list(punctuation))))
-
-   punctuationMapping = str.maketrans({key: " " for key in punctuation})
 
-   with open("map_punctuationMapping.pkl", "wb") as mapping_out:
-      pickle.dump(punctuationMapping, mapping_out)
+   return str.maketrans({key: " " for key in punctuation})
 
 #############################################
 # ASCII, Hiragana, katakana and kanji only. #
@@ -154,3 +135,39 @@ except FileNotFoundError:
 # 
 #    with open("map_emojiOtherSymbolsMapping.pkl", "wb") as mapping_out:
 #       pickle.dump(emojiOtherSymbolsMapping, mapping_out)
+
+#####################
+# Generated tables. #
+#####################
+
+def formatMapping(name, mapping):
+   """Write a str.translate mapping as a Python dict literal, one escaped entry per line."""
+   lines = ["{} = {{".format(name)]
+   for key in sorted(mapping):
+      lines.append("   0x{:04X}: {},".format(key, ascii(mapping[key])))
+   lines.append("}")
+   return "\n".join(lines)
+
+def writeTables(path=tablesPath):
+   """Build every mapping and write them to a module of constants."""
+   mappings = [
+      ("asciiFullToHalfMapping", buildAsciiFullToHalfMapping()),
+      ("japHalfToFullMapping", buildJapHalfToFullMapping()),
+      ("punctuationMapping", buildPunctuationMapping())
+   ]
+   parts = [
+      "# -*- coding: utf-8 -*-",
+      '"""Character mappings for str.translate. Generated by create_mappings.py, do not edit."""',
+      "",
+      "version = {}".format(mappingsVersion)
+   ]
+   for name, mapping in mappings:
+      parts += ["", formatMapping(name, mapping)]
+   path.write_text("\n".join(parts) + "\n", encoding="utf-8")
+
+if __name__ == "__main__":
+   writeTables()
+else:
+   from mapping_tables import version, asciiFullToHalfMapping, japHalfToFullMapping, punctuationMapping
+   if version != mappingsVersion:
+      raise ImportError("mapping_tables.py is out of date, run `python create_mappings.py` to regenerate it.")
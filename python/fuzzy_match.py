@@ -2,15 +2,19 @@
 # -*- coding: utf-8 -*-
 """Perform a fuzzy match of the transcriptions from the WAV files on the stripped and cleaned text."""
 
-import pickle
 from itertools import accumulate
 
-import MeCab
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+import numpy as np
 
-from normalize import normalizeSentence as normalize
-from create_mappings import punctuationMapping
+from normalize import normalizeCached as normalize
+from corpus_index import CorpusIndex
+from similarity import ratios
+from alignment import locateSpans
+from readings import reading
+from cascade import Cascade, defaultOrder
+from results_store import ResultsStore, fingerprint
+from charclass import classOf, PUNCTUATION
+import segmenter
 
 strippedSourceText = "./stripped.txt"
 transcriptionsFilePath = "./transcriptions.txt"
@@ -18,29 +22,23 @@ transcriptionsFilePath = "./transcriptions.txt"
 # strippedSourceText = "./stripped_ch1.txt"
 # transcriptionsFilePath = "./transcriptions_ch1.txt"
 
+resultsStorePath = "./bestMatches.jsonl"
+
+shortlistSize = 50 # Number of sentences retrieved from the n-gram index for fuzzy scoring.
+phoneticShortlistSize = 50 # Number of sentences retrieved from the phonetic index when the n-gram index finds none, 0 to never.
+yomiWeight = 0.75 # Weight of the pronunciation-level score against the surface-level one.
+candidateThreshold = 0.5 # Minimum combined score of a candidate sentence.
+cascadeOrder = defaultOrder # Order of the filters applied to the shortlist, see cascade.py.
 splittingChars = {"\n", "。"} # {"\n", "。", "　", "、"}
-punctuation = set(map(chr, punctuationMapping.keys()))
+
+def yieldSentenceSpans(filepath):
+   """Yield sentence-like strings together with their character offsets as (start, end, sentence)."""
+   return segmenter.yieldSentenceSpans(filepath, splittingChars)
 
 def yieldSentences(filepath):
-   """
-   " Yield sentence-like strings.
-   " Could do with a refactor for that pesky final yield.
-   " Maybe use while loops instead...
-   """
-   with open(filepath, "r") as f:
-      newSent = ""
-      for line in f: # Go through lines of file.
-         for char in line: # Go through chars of a line.
-            if char: # Safety.
-               newSent += char # Add the char.
-               if char in splittingChars: # Yield if we're on a splitting char.
-                  if newSent not in splittingChars: # But only if it's a non-trivial sentence.
-                     yield newSent
-                     newSent = "" # Reinitialize the sentence.
-                  else: # Otherwise, reinitialize the sentence and try again.
-                     newSent = ""
-                     continue
-      yield newSent # Yield final line.
+   """Yield sentence-like strings."""
+   for _, _, s in yieldSentenceSpans(filepath):
+      yield s
 
 def yieldPathsTranscriptions(filepath):
    """Yield paths and pre-computed transcriptions."""
@@ -54,153 +52,144 @@ def yieldPathsTranscriptions(filepath):
             transcription = ""
          yield path, transcription
 
-def findCandidates(t):
-   """Find candidate sentences for a transcription."""
-   tagger = MeCab.Tagger("-Oyomi")
-
-   sentences = yieldSentences(strippedSourceText)
-
-   candidates = []
-   for s in sentences:
-
-      # Surface-level similarity.
-      normT = normalize(t)
-      normS = normalize(s)
-      if not (normT and normS):
-         continue
-      p = fuzz.partial_ratio(normT, normS)
-
-      # Pronunciation-level similarity.
-      yomiT = normalize(tagger.parse(t))
-      yomiS = normalize(tagger.parse(s))
-      q = 0.75 * fuzz.partial_ratio(yomiT, yomiS)
-
-      # Combine the scores.
-      r = (p + q) / 175 # (0 <= p + q <= 175)
-
-      # Only consider if r >= 0.5.
-      if r >= 0.5:
-         candidates += [s]
-
-   return candidates
-
-def realign(parSent, fullSent):
-   print(parSent, fullSent)
-   tagger = MeCab.Tagger("-Owakati")
-
-   # Get MeCab's 分かち書き as a list of blocks.
-   splitSent = tagger.parse(fullSent).strip().split(" ")
-   print(splitSent)
+corpusIndex = None
+def loadCorpusIndex(filepath=strippedSourceText):
+   """Build the corpus index for the source text once and reuse it for every transcription."""
+   global corpusIndex
+   if corpusIndex is None:
+      corpusIndex = CorpusIndex.fromSpans(yieldSentenceSpans(filepath))
+   return corpusIndex
 
-   # Verify nothing went wrong.
-   if fullSent.strip() != ''.join(splitSent):
-      raise RuntimeError("MeCab messed up the 分かち書き.")
-   
+cascade = Cascade({"surface": 1, "yomi": yomiWeight}, candidateThreshold, cascadeOrder)
 
-def searchWindows(t, cs):
-   """Search the windows from normalized candidates and return best match. Combines surface- and pronunciation-level information."""
+def findCandidates(t, index=None):
+   """Find candidate sentences for a transcription and return their ids in the corpus index."""
+   if index is None:
+      index = loadCorpusIndex()
 
+   # The transcription only needs to be normalized and parsed once.
    normT = normalize(t)
-   normCs = list(map(normalize, cs))
-
-   # Use MeCab for the pronunciations.
-   tagger = MeCab.Tagger("-Oyomi")
-   
-   # Make the windows.
-   absMaxDeviation = len(normT) // 2
-   windowSizes = range(len(normT) - absMaxDeviation, len(normT) + absMaxDeviation)
-   
-   surfWindows = [
-      (normC[i:i + size], normCs.index(normC))
-      for normC in normCs
-      for size in windowSizes
-      for i in range(len(normC) - size + 1)
-   ]
-
-   pronWindows = [tagger.parse(w[0]).strip() for w in surfWindows]
-
-   bestPron = process.extractOne(tagger.parse(normT), pronWindows, scorer=fuzz.ratio)
-
-   if bestPron:
-      # Use best pronunciation to get surface form, since indexing was preserved.
-      best, source = surfWindows[pronWindows.index(bestPron[0])]
-   else:
-      # No good matches found in candidates (bestPron == None).
-      best = ""
-      source = -1
-   
-   # best = realign(best, cs[source])
-
-   return best, source
-
-def denormalize(best, candidate):
-   """Recover the original characters/punctuation of the best match."""
+   yomiT = reading(t)
+   if not normT:
+      return []
+
+   # Look up sentences that look alike, and only if none of them will do, those that sound alike.
+   kept = scoreShortlist(normT, yomiT, index.shortlist(normT, yomiT, shortlistSize), index)
+   if not kept and phoneticShortlistSize:
+      kept = scoreShortlist(normT, yomiT, index.soundsLike(yomiT, phoneticShortlistSize), index)
+   return kept
+
+def scoreShortlist(normT, yomiT, shortlist, index):
+   """Return the ids in the shortlist of the sentences good enough to be candidates."""
+   # Only consider non-empty sentences.
+   shortlist = np.array(shortlist, dtype=np.int64)
+   shortlist = shortlist[index.encodedSurfaces.lengths[shortlist] > 0]
+
+   # Keep sentences with (p + 0.75 * q) / 175 >= 0.5, where p and q are the surface-level and
+   # pronunciation-level similarities, rejecting most of them with cheap bounds first.
+   kept, _ = cascade(
+      {"surface": normT, "yomi": yomiT},
+      {"surface": index.profile("surface"), "yomi": index.profile("yomi")},
+      shortlist
+   )
+   return kept.tolist()
+
+def searchWindows(t, cs, index=None):
+   """
+   " Locate the best matching span of the transcription in each candidate and return the best span
+   " as (start, end) offsets in the normalized surface form, along with its sentence id.
+   " Spans are found on the readings by alignment and mapped back to the surface form through the morpheme boundaries.
+   """
+   if index is None:
+      index = loadCorpusIndex()
 
-   # Find potential head and tail indices.
-   head = best[0]
-   tail = best[-1]
+   # Use MeCab for the pronunciation of the transcription only.
+   yomiT = reading(t)
+   if not (cs and yomiT):
+      return 0, 0, -1
+   cs = np.array(cs, dtype=np.int64)
 
-   headInds = [i for i, c in enumerate(candidate) if c == head]
-   tailInds = [i for i, c in enumerate(candidate) if c == tail]
+   # One alignment per candidate reading instead of every window of every size.
+   starts, ends, _ = locateSpans(yomiT, index.encodedYomis.take(cs))
+   yomiSpans = [index.yomis[c][s:e] for c, s, e in zip(cs, starts, ends)]
+   scores = ratios(yomiT, yomiSpans)
 
-   # Try all possible substrings.
-   for h in headInds:
-      for t in tailInds:
+   bestInd = int(np.argmax(scores))
+   source = int(cs[bestInd])
 
-         # Return the candidate whose normalization matches.
-         if normalize(candidate[h:t + 1]) == best:
+   # Go back to the surface form, which always falls on morpheme boundaries.
+   start, end = index.surfaceSpan(source, starts[bestInd], ends[bestInd])
+   start, end = index.normalizedSpan(source, start, end)
+   if end <= start:
+      # No good matches found in candidates.
+      return 0, 0, -1
 
-            # Keep trailing punctuation.
-            if candidate[t + 1] in (punctuation | splittingChars):
-               return candidate[h:t + 2]
-            else:
-               return candidate[h:t + 1]
+   return start, end, source
 
-   # In case nothing matches, which is a possibility, return our best try.
-   return best
+def denormalize(start, end, candidate, sources):
+   """
+   " Recover the original characters/punctuation of the normalized span [start, end) of a candidate,
+   " using the source index of every normalized character kept during normalization.
+   """
+   if end <= start:
+      return ""
+   h = sources[start]
+   t = sources[end - 1]
+
+   # Keep trailing punctuation.
+   if t + 1 < len(candidate) and (classOf(candidate[t + 1]) & PUNCTUATION or candidate[t + 1] in splittingChars):
+      return candidate[h:t + 2]
+   else:
+      return candidate[h:t + 1]
 
-def findBestMatch(t):
+def findBestMatch(t, index=None):
    """Check transcription against candidates and find the best match for each."""
+   if index is None:
+      index = loadCorpusIndex()
 
-   cs = findCandidates(t)
+   cs = findCandidates(t, index)
 
    normT = normalize(t)
-   normCs = list(map(normalize, cs))
    best = ""
    source = -1
-   if len(normCs) == 0: # No matches.
+   if len(cs) == 0: # No matches.
       best = ""
-   elif len(normCs) == 1 and normT == normCs[0]: # "Perfect" matches.
-      best = cs.pop()
+   elif len(cs) == 1 and normT == index.surfaces[cs[0]]: # "Perfect" matches.
+      best = index.sentences[cs.pop()]
    else: # Search for best match.
-      best, source = searchWindows(t, cs)
+      start, end, source = searchWindows(t, cs, index)
 
    # Denormalize if needed.
    if source != -1:
-      best = denormalize(best, cs[source])
+      best = denormalize(start, end, index.sentences[source], index.surfaceSources[source])
 
    return best
 
+def matcherParameters():
+   """Everything besides the source text that changes the results of findBestMatch."""
+   return {
+      "shortlistSize": shortlistSize,
+      "phoneticShortlistSize": phoneticShortlistSize,
+      "yomiWeight": yomiWeight,
+      "candidateThreshold": candidateThreshold,
+      "splittingChars": sorted(splittingChars)
+   }
+
 def yieldBestMatches():
-   """Find and yield best match for every transcription."""
-   try:
-      # Takes a while to calculate, so load the saved file instead.
-      with open("list_bestMatches.pkl", "rb") as pickle_in:
-         bestMatches = pickle.load(pickle_in)
-   except FileNotFoundError:
-      # Do the calculations and make the file if it doesn't exist.
-      pathsTranscriptions = yieldPathsTranscriptions(transcriptionsFilePath)
-      bestMatches = []
-      for p, t in pathsTranscriptions:
-         m = findBestMatch(t)
-         print(p, t, m)
-         bestMatches.append((p, t, m))
+   """
+   " Find and yield best match for every transcription.
+   " Results are checkpointed in batches, so a rerun only computes the transcriptions
+   " that are missing or whose source text, transcription or matcher parameters have changed.
+   """
+   key = fingerprint([strippedSourceText], matcherParameters())
+   with ResultsStore(resultsStorePath, key) as store:
+      for p, t in yieldPathsTranscriptions(transcriptionsFilePath):
+         m = store.get(p, t)
+         if m is None:
+            m = findBestMatch(t)
+            print(p, t, m)
+            store.put(p, t, m)
          yield p, t, m
-      with open("list_bestMatches.pkl", "wb") as pickle_out:
-         pickle.dump(bestMatches, pickle_out)
-   else:
-      # Yield from the successfully loaded list.
-      yield from bestMatches
 
 # def realign(subMatches, sent):
 #    # print(subMatches, sent)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Start Julius servers, connect as soon as they listen, and restart the ones that die or hang on the files they have left."""
+
+import os
+import asyncio
+import tempfile
+from pathlib import Path
+
+from call_julius import HOST, CHUNK_SIZE, QUEUE_SIZE, BATCH_SIZE, JuliusParser, databasePath, yieldFilepaths, transcribeAll
+
+##############
+# CONSTANTS. #
+##############
+STARTUP_TIMEOUT = 120 # Seconds a server may take to start listening.
+IDLE_TIMEOUT = 600 # Seconds a server may go without sending anything, i.e. longest time spent on one file.
+STOP_TIMEOUT = 10 # Seconds a server has to exit on its own, or once terminated, before it is killed.
+FIRST_DELAY = 0.05 # Seconds before the port is probed again, doubling every time...
+MAX_DELAY = 2.0 # ... up to this.
+RESTARTS = 3 # Times a server may be restarted on its remaining files before the job is given up.
+
+class JuliusError(Exception):
+   """A Julius server exited, never started listening or stopped sending output."""
+
+###############
+# One server. #
+###############
+class JuliusServer:
+   """A Julius process listening on a port in module mode, started from command."""
+
+   def __init__(self, command, port):
+      self.command = [str(c) for c in command]
+      self.port = port
+      self.process = None
+
+   async def start(self):
+      self.process = await asyncio.create_subprocess_exec(*self.command)
+
+   def describe(self):
+      return f"Julius on {HOST}:{self.port}"
+
+   async def connect(self, timeout=STARTUP_TIMEOUT):
+      """
+      " Probe the port, waiting twice as long after every refusal, until the server accepts.
+      " Julius starts on its files as soon as a client connects, so the probe is kept and read from.
+      """
+      loop = asyncio.get_running_loop()
+      deadline = loop.time() + timeout
+      delay = FIRST_DELAY
+      while True:
+         if self.process.returncode is not None:
+            raise JuliusError(f"{self.describe()} exited with code {self.process.returncode} before listening.")
+         try:
+            return await asyncio.open_connection(HOST, self.port)
+         except OSError:
+            pass
+         if loop.time() + delay > deadline:
+            raise JuliusError(f"{self.describe()} not listening after {timeout}s.")
+         await asyncio.sleep(delay)
+         delay = min(2 * delay, MAX_DELAY)
+
+   async def readSentences(self, reader, idleTimeout=IDLE_TIMEOUT):
+      """
+      " Yield the sentence of every file from the connection, in order.
+      " The last file is only complete when Julius closes the connection and exits cleanly:
+      " if it crashed instead, its output may have been cut short and isn't used.
+      """
+      parser = JuliusParser()
+      while True:
+         try:
+            data = await asyncio.wait_for(reader.read(CHUNK_SIZE), idleTimeout)
+         except asyncio.TimeoutError:
+            raise JuliusError(f"{self.describe()} sent nothing for {idleTimeout}s.") from None
+         except OSError as e:
+            # A crashed Julius may reset the connection rather than close it.
+            raise JuliusError(f"{self.describe()} lost the connection: {e!r}.") from None
+         if not data:
+            break
+         for sentence in parser.feed(data):
+            yield sentence
+
+      try:
+         returncode = await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+      except asyncio.TimeoutError:
+         # Still running with nothing more to say: it is done.
+         returncode = 0
+      if returncode != 0:
+         raise JuliusError(f"{self.describe()} exited with code {returncode}.")
+      for sentence in parser.close():
+         yield sentence
+
+   async def stop(self):
+      """Terminate the process if it is still running, and kill it if it doesn't exit in time."""
+      if self.process is None or self.process.returncode is not None:
+         return
+      self.process.terminate()
+      try:
+         await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+      except asyncio.TimeoutError:
+         self.process.kill()
+         await self.process.wait()
+
+################
+# Supervision. #
+################
+class Supervisor:
+   """
+   " Run one Julius server per job and pair its sentences with the files of the job's filelist.
+   " makeCommand(port, filelist) gives the command starting Julius on a port with a filelist.
+   " A server that exits early, never listens or goes quiet is stopped and started again
+   " on the files it hasn't transcribed yet, up to restarts times. Whatever happens, the process
+   " is stopped before the job returns, and the job reports how far it got.
+   " route(path) gives the database a file's transcription is saved in, e.g. call_julius.workDatabase;
+   " by default it is the database of the work the filelist is named after.
+   """
+
+   def __init__(self, makeCommand, startupTimeout=STARTUP_TIMEOUT, idleTimeout=IDLE_TIMEOUT, restarts=RESTARTS, route=None):
+      self.makeCommand = makeCommand
+      self.route = route
+      self.startupTimeout = startupTimeout
+      self.idleTimeout = idleTimeout
+      self.restarts = restarts
+
+   def remainingFilelist(self, filelist, files):
+      """Write the files still to do to a filelist of their own."""
+      with tempfile.NamedTemporaryFile("w", prefix=Path(filelist).stem + ".", suffix=".txt", delete=False) as f:
+         f.write("".join(path + "\n" for path in files))
+      return Path(f.name)
+
+   async def transcribe(self, port, filelist, results, queueSize=QUEUE_SIZE):
+      """Supervised counterpart of call_julius.transcribe, returning a report on the job."""
+      dbPath = databasePath(filelist)
+      files = [path for path in yieldFilepaths(str(filelist)) if path]
+      pending = asyncio.Semaphore(queueSize)
+      done = 0
+      errors = []
+
+      while done < len(files) and len(errors) <= self.restarts:
+         currentList = Path(filelist) if done == 0 else self.remainingFilelist(filelist, files[done:])
+         server = JuliusServer(self.makeCommand(port, currentList), port)
+         try:
+            await server.start()
+            reader, writer = await server.connect(self.startupTimeout)
+            try:
+               sentences = server.readSentences(reader, self.idleTimeout)
+               async for sentence in sentences:
+                  await pending.acquire()
+                  path = files[done]
+                  results.put_nowait((pending, self.route(path) if self.route else dbPath, (path, sentence)))
+                  done += 1
+                  if done == len(files):
+                     break
+               await sentences.aclose()
+            finally:
+               writer.close()
+            if done < len(files):
+               raise JuliusError(f"{server.describe()} stopped after {done} of {len(files)} files.")
+         except (JuliusError, OSError) as e:
+            # Other I/O errors with the server (e.g. it can't be started) are handled the same way.
+            error = str(e) if isinstance(e, JuliusError) else f"{server.describe()}: {e!r}."
+            print(error)
+            errors.append(error)
+         finally:
+            await server.stop()
+            if currentList != Path(filelist):
+               os.unlink(currentList)
+
+      report = {"filelist": str(filelist), "done": done, "files": len(files), "errors": errors}
+      if done < len(files):
+         print(f"Gave up on {filelist} after {len(errors)} failures, {len(files) - done} files left.")
+      return report
+
+def main(jobs, makeCommand, queueSize=QUEUE_SIZE, batchSize=BATCH_SIZE, **options):
+   """
+   " Transcribe every (port, filelist) job under supervision from this process.
+   " Return the reports of the jobs that didn't finish.
+   """
+   supervisor = Supervisor(makeCommand, **options)
+   outcomes = asyncio.run(transcribeAll(jobs, queueSize, batchSize, supervisor.transcribe))
+   reports = []
+   for (_, filelist), outcome in zip(jobs, outcomes):
+      if isinstance(outcome, BaseException):
+         # An error the supervisor doesn't handle: how far the job got is unknown.
+         files = sum(1 for path in yieldFilepaths(str(filelist)) if path)
+         outcome = {"filelist": str(filelist), "done": 0, "files": files, "errors": [repr(outcome)]}
+      reports.append(outcome)
+   return [r for r in reports if r["done"] < r["files"]]
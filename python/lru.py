@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A small thread-safe LRU cache shared by the modules that memoize results."""
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+   """A size-bounded mapping that forgets the least recently used entries and counts hits and misses."""
+
+   def __init__(self, maxSize):
+      self.maxSize = maxSize
+      self.entries = OrderedDict()
+      self.lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+
+   def get(self, key):
+      """Return the cached value for key, or None."""
+      with self.lock:
+         value = self.entries.get(key)
+         if value is None:
+            self.misses += 1
+         else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+         return value
+
+   def put(self, key, value):
+      with self.lock:
+         self.entries[key] = value
+         self.entries.move_to_end(key)
+         while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+   def clear(self):
+      with self.lock:
+         self.entries.clear()
+         self.hits = 0
+         self.misses = 0
+
+   def info(self):
+      """Hit and miss counters along with the current and maximum size."""
+      with self.lock:
+         return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxSize": self.maxSize}
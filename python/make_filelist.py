@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 """List all sound files in data and put in data.db for processing. Create filelist.txt for Julius."""
 
-import sqlite3
 from pathlib import Path
 
+from sqlite_writer import BatchWriter, connect
+
 def yieldInts():
    i = 0
    while True:
@@ -20,19 +21,8 @@ dbPath = dataPath / "data.db"
 
 newInt = yieldInts()
 
-with sqlite3.connect(str(dbPath.resolve())) as conn:
-   conn.execute(
-      """
-         CREATE TABLE IF NOT EXISTS file_transcriptions (
-            file_path text UNIQUE,
-            julius_transcription text,
-            best_matches text,
-            final_transcription text
-         );
-      """
-   )
-
-   
+conn = connect(dbPath.resolve())
+with BatchWriter(conn) as writer:
    for work in sorted(dataPath.iterdir()):
       if work.is_dir():
          filelistPath = filelistDir / f"./{str(work).split('/')[-1].strip()}.txt"
@@ -41,15 +31,8 @@ with sqlite3.connect(str(dbPath.resolve())) as conn:
             if soundDir.is_dir():
                for soundFile in sorted(soundDir.iterdir()):
                   if soundFile.is_file() and soundFile.suffix == ".wav":
-                     try:
-                        conn.execute(
-                           """
-                              INSERT INTO file_transcriptions(file_path)
-                              VALUES (?);
-                           """,
-                           (str(soundFile.resolve()),)
-                        )
-                     except sqlite3.IntegrityError:
-                        pass
+                     # Files already in the database are left alone.
+                     writer.write((str(soundFile.resolve()),))
 
                      filelist.write(str(soundFile.resolve()) + "\n")
+conn.close()
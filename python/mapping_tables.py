@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""Character mappings for str.translate. Generated by create_mappings.py, do not edit."""
+
+version = 1
+
+asciiFullToHalfMapping = {
+   0x3000: ' ',
+   0x3007: '0',
+   0xFF01: '!',
+   0xFF02: '"',
+   0xFF03: '#',
+   0xFF04: '$',
+   0xFF05: '%',
+   0xFF06: '&',
+   0xFF07: "'",
+   0xFF08: '(',
+   0xFF09: ')',
+   0xFF0A: '*',
+   0xFF0B: '+',
+   0xFF0C: ',',
+   0xFF0D: '-',
+   0xFF0E: '.',
+   0xFF0F: '/',
+   0xFF10: '0',
+   0xFF11: '1',
+   0xFF12: '2',
+   0xFF13: '3',
+   0xFF14: '4',
+   0xFF15: '5',
+   0xFF16: '6',
+   0xFF17: '7',
+   0xFF18: '8',
+   0xFF19: '9',
+   0xFF1A: ':',
+   0xFF1B: ';',
+   0xFF1C: '<',
+   0xFF1D: '=',
+   0xFF1E: '>',
+   0xFF1F: '?',
+   0xFF20: '@',
+   0xFF21: 'A',
+   0xFF22: 'B',
+   0xFF23: 'C',
+   0xFF24: 'D',
+   0xFF25: 'E',
+   0xFF26: 'F',
+   0xFF27: 'G',
+   0xFF28: 'H',
+   0xFF29: 'I',
+   0xFF2A: 'J',
+   0xFF2B: 'K',
+   0xFF2C: 'L',
+   0xFF2D: 'M',
+   0xFF2E: 'N',
+   0xFF2F: 'O',
+   0xFF30: 'P',
+   0xFF31: 'Q',
+   0xFF32: 'R',
+   0xFF33: 'S',
+   0xFF34: 'T',
+   0xFF35: 'U',
+   0xFF36: 'V',
+   0xFF37: 'W',
+   0xFF38: 'X',
+   0xFF39: 'Y',
+   0xFF3A: 'Z',
+   0xFF3B: '[',
+   0xFF3C: '\\',
+   0xFF3D: ']',
+   0xFF3E: '^',
+   0xFF3F: '_',
+   0xFF40: '`',
+   0xFF41: 'a',
+   0xFF42: 'b',
+   0xFF43: 'c',
+   0xFF44: 'd',
+   0xFF45: 'e',
+   0xFF46: 'f',
+   0xFF47: 'g',
+   0xFF48: 'h',
+   0xFF49: 'i',
+   0xFF4A: 'j',
+   0xFF4B: 'k',
+   0xFF4C: 'l',
+   0xFF4D: 'm',
+   0xFF4E: 'n',
+   0xFF4F: 'o',
+   0xFF50: 'p',
+   0xFF51: 'q',
+   0xFF52: 'r',
+   0xFF53: 's',
+   0xFF54: 't',
+   0xFF55: 'u',
+   0xFF56: 'v',
+   0xFF57: 'w',
+   0xFF58: 'x',
+   0xFF59: 'y',
+   0xFF5A: 'z',
+   0xFF5B: '{',
+   0xFF5C: '|',
+   0xFF5D: '}',
+   0xFF5E: '~',
+   0xFF5F: '\u2985',
+   0xFF60: '\u2986',
+   0xFFE0: '\xa2',
+   0xFFE1: '\xa3',
+   0xFFE2: '\xac',
+   0xFFE3: '\xaf',
+   0xFFE4: '\xa6',
+   0xFFE5: '\xa5',
+   0xFFE6: '\u20a9',
+}
+
+japHalfToFullMapping = {
+   0xFF61: '\u3002',
+   0xFF62: '\u300c',
+   0xFF63: '\u300d',
+   0xFF64: '\u3001',
+   0xFF65: '\u30fb',
+   0xFF66: '\u30f2',
+   0xFF67: '\u30a1',
+   0xFF68: '\u30a3',
+   0xFF69: '\u30a5',
+   0xFF6A: '\u30a7',
+   0xFF6B: '\u30a9',
+   0xFF6C: '\u30e3',
+   0xFF6D: '\u30e5',
+   0xFF6E: '\u30e5',
+   0xFF6F: '\u30c3',
+   0xFF70: '\u30fc',
+   0xFF71: '\u30a2',
+   0xFF72: '\u30a4',
+   0xFF73: '\u30a6',
+   0xFF74: '\u30a8',
+   0xFF75: '\u30aa',
+   0xFF76: '\u30ab',
+   0xFF77: '\u30ad',
+   0xFF78: '\u30af',
+   0xFF79: '\u30b1',
+   0xFF7A: '\u30b3',
+   0xFF7B: '\u30b5',
+   0xFF7C: '\u30b7',
+   0xFF7D: '\u30b9',
+   0xFF7E: '\u30bb',
+   0xFF7F: '\u30bd',
+   0xFF80: '\u30bf',
+   0xFF81: '\u30c1',
+   0xFF82: '\u30c4',
+   0xFF83: '\u30c6',
+   0xFF84: '\u30c8',
+   0xFF85: '\u30ca',
+   0xFF86: '\u30cb',
+   0xFF87: '\u30cc',
+   0xFF88: '\u30cd',
+   0xFF89: '\u30ce',
+   0xFF8A: '\u30cf',
+   0xFF8B: '\u30d2',
+   0xFF8C: '\u30d5',
+   0xFF8D: '\u30d8',
+   0xFF8E: '\u30db',
+   0xFF8F: '\u30de',
+   0xFF90: '\u30df',
+   0xFF91: '\u30e0',
+   0xFF92: '\u30e1',
+   0xFF93: '\u30e2',
+   0xFF94: '\u30e4',
+   0xFF95: '\u30e6',
+   0xFF96: '\u30e8',
+   0xFF97: '\u30e9',
+   0xFF98: '\u30ea',
+   0xFF99: '\u30eb',
+   0xFF9A: '\u30ec',
+   0xFF9B: '\u30ed',
+   0xFF9C: '\u30ef',
+   0xFF9D: '\u30f3',
+   0xFF9E: '\u309b',
+   0xFF9F: '\u309c',
+   0xFFE8: '\uff5c',
+   0xFFE9: '\u2190',
+   0xFFEA: '\u2191',
+   0xFFEB: '\u2192',
+   0xFFEC: '\u2193',
+   0xFFED: '\u25a0',
+   0xFFEE: '\u25cb',
+}
+
+punctuationMapping = {
+   0x0021: ' ',
+   0x0022: ' ',
+   0x0023: ' ',
+   0x0024: ' ',
+   0x0025: ' ',
+   0x0026: ' ',
+   0x0027: ' ',
+   0x0028: ' ',
+   0x0029: ' ',
+   0x002A: ' ',
+   0x002B: ' ',
+   0x002C: ' ',
+   0x002D: ' ',
+   0x002E: ' ',
+   0x002F: ' ',
+   0x003A: ' ',
+   0x003B: ' ',
+   0x003C: ' ',
+   0x003D: ' ',
+   0x003E: ' ',
+   0x003F: ' ',
+   0x0040: ' ',
+   0x005B: ' ',
+   0x005C: ' ',
+   0x005D: ' ',
+   0x005E: ' ',
+   0x005F: ' ',
+   0x0060: ' ',
+   0x007B: ' ',
+   0x007C: ' ',
+   0x007D: ' ',
+   0x007E: ' ',
+   0x00A1: ' ',
+   0x00AB: ' ',
+   0x00B7: ' ',
+   0x00BB: ' ',
+   0x00BF: ' ',
+   0x037E: ' ',
+   0x0387: ' ',
+   0x055D: ' ',
+   0x055E: ' ',
+   0x0589: ' ',
+   0x058A: ' ',
+   0x060C: ' ',
+   0x061B: ' ',
+   0x061F: ' ',
+   0x06D4: ' ',
+   0x0701: ' ',
+   0x0706: ' ',
+   0x07F8: ' ',
+   0x07F9: ' ',
+   0x0830: ' ',
+   0x083D: ' ',
+   0x0964: ' ',
+   0x0EAF: ' ',
+   0x1361: ' ',
+   0x1362: ' ',
+   0x1363: ' ',
+   0x1364: ' ',
+   0x1365: ' ',
+   0x1367: ' ',
+   0x14FE: ' ',
+   0x166E: ' ',
+   0x1680: ' ',
+   0x16F6: ' ',
+   0x16F7: ' ',
+   0x1803: ' ',
+   0x1806: ' ',
+   0x1808: ' ',
+   0x1944: ' ',
+   0x1B5D: ' ',
+   0x1B5E: ' ',
+   0x1B5F: ' ',
+   0x2010: ' ',
+   0x2011: ' ',
+   0x2012: ' ',
+   0x2013: ' ',
+   0x2014: ' ',
+   0x2015: ' ',
+   0x2016: ' ',
+   0x2017: ' ',
+   0x2018: ' ',
+   0x2019: ' ',
+   0x201A: ' ',
+   0x201B: ' ',
+   0x201C: ' ',
+   0x201D: ' ',
+   0x201E: ' ',
+   0x201F: ' ',
+   0x2020: ' ',
+   0x2021: ' ',
+   0x2022: ' ',
+   0x2023: ' ',
+   0x2024: ' ',
+   0x2025: ' ',
+   0x2026: ' ',
+   0x2027: ' ',
+   0x2030: ' ',
+   0x2031: ' ',
+   0x2032: ' ',
+   0x2033: ' ',
+   0x2034: ' ',
+   0x2035: ' ',
+   0x2036: ' ',
+   0x2037: ' ',
+   0x2038: ' ',
+   0x2039: ' ',
+   0x203A: ' ',
+   0x203B: ' ',
+   0x203C: ' ',
+   0x203D: ' ',
+   0x203E: ' ',
+   0x203F: ' ',
+   0x2040: ' ',
+   0x2041: ' ',
+   0x2042: ' ',
+   0x2043: ' ',
+   0x2044: ' ',
+   0x2045: ' ',
+   0x2046: ' ',
+   0x2047: ' ',
+   0x2048: ' ',
+   0x2049: ' ',
+   0x204A: ' ',
+   0x204B: ' ',
+   0x204C: ' ',
+   0x204D: ' ',
+   0x204E: ' ',
+   0x204F: ' ',
+   0x2050: ' ',
+   0x2051: ' ',
+   0x2052: ' ',
+   0x2053: ' ',
+   0x2054: ' ',
+   0x2055: ' ',
+   0x2056: ' ',
+   0x2057: ' ',
+   0x2058: ' ',
+   0x2059: ' ',
+   0x205A: ' ',
+   0x205B: ' ',
+   0x205C: ' ',
+   0x205D: ' ',
+   0x205E: ' ',
+   0x275B: ' ',
+   0x275C: ' ',
+   0x275D: ' ',
+   0x275E: ' ',
+   0x275F: ' ',
+   0x276E: ' ',
+   0x276F: ' ',
+   0x2985: ' ',
+   0x2986: ' ',
+   0x2CF9: ' ',
+   0x2CFA: ' ',
+   0x2CFB: ' ',
+   0x2CFE: ' ',
+   0x2E00: ' ',
+   0x2E01: ' ',
+   0x2E02: ' ',
+   0x2E03: ' ',
+   0x2E04: ' ',
+   0x2E05: ' ',
+   0x2E06: ' ',
+   0x2E07: ' ',
+   0x2E08: ' ',
+   0x2E09: ' ',
+   0x2E0A: ' ',
+   0x2E0B: ' ',
+   0x2E0C: ' ',
+   0x2E0D: ' ',
+   0x2E0E: ' ',
+   0x2E0F: ' ',
+   0x2E10: ' ',
+   0x2E11: ' ',
+   0x2E12: ' ',
+   0x2E13: ' ',
+   0x2E14: ' ',
+   0x2E15: ' ',
+   0x2E16: ' ',
+   0x2E17: ' ',
+   0x2E18: ' ',
+   0x2E19: ' ',
+   0x2E1A: ' ',
+   0x2E1B: ' ',
+   0x2E1C: ' ',
+   0x2E1D: ' ',
+   0x2E1E: ' ',
+   0x2E1F: ' ',
+   0x2E20: ' ',
+   0x2E21: ' ',
+   0x2E22: ' ',
+   0x2E23: ' ',
+   0x2E24: ' ',
+   0x2E25: ' ',
+   0x2E26: ' ',
+   0x2E27: ' ',
+   0x2E28: ' ',
+   0x2E29: ' ',
+   0x2E2A: ' ',
+   0x2E2B: ' ',
+   0x2E2C: ' ',
+   0x2E2D: ' ',
+   0x2E2E: ' ',
+   0x2E2F: ' ',
+   0x2E30: ' ',
+   0x2E31: ' ',
+   0x2E32: ' ',
+   0x2E33: ' ',
+   0x2E34: ' ',
+   0x2E35: ' ',
+   0x2E36: ' ',
+   0x2E37: ' ',
+   0x2E38: ' ',
+   0x2E39: ' ',
+   0x2E3A: ' ',
+   0x2E3B: ' ',
+   0x2E3C: ' ',
+   0x2E3D: ' ',
+   0x2E3E: ' ',
+   0x2E3F: ' ',
+   0x2E40: ' ',
+   0x2E41: ' ',
+   0x2E42: ' ',
+   0x2E43: ' ',
+   0x2E44: ' ',
+   0x2E45: ' ',
+   0x2E46: ' ',
+   0x2E47: ' ',
+   0x2E48: ' ',
+   0x2E49: ' ',
+   0x2E4A: ' ',
+   0x2E4B: ' ',
+   0x2E4C: ' ',
+   0x2E4D: ' ',
+   0x2E4E: ' ',
+   0x2E4F: ' ',
+   0x3001: ' ',
+   0x3002: ' ',
+   0x3003: ' ',
+   0x3008: ' ',
+   0x3009: ' ',
+   0x300A: ' ',
+   0x300B: ' ',
+   0x300C: ' ',
+   0x300D: ' ',
+   0x300E: ' ',
+   0x300F: ' ',
+   0x3010: ' ',
+   0x3011: ' ',
+   0x3014: ' ',
+   0x3015: ' ',
+   0x3016: ' ',
+   0x3017: ' ',
+   0x3018: ' ',
+   0x3019: ' ',
+   0x301A: ' ',
+   0x301B: ' ',
+   0x301C: ' ',
+   0x301D: ' ',
+   0x301E: ' ',
+   0x301F: ' ',
+   0x3030: ' ',
+   0x30A0: ' ',
+   0xA4FF: ' ',
+   0xA60D: ' ',
+   0xA60E: ' ',
+   0xA60F: ' ',
+   0xA6F3: ' ',
+   0xA6F4: ' ',
+   0xA6F5: ' ',
+   0xAAF1: ' ',
+   0xFE19: ' ',
+   0xFE63: ' ',
+   0xFF01: ' ',
+   0xFF02: ' ',
+   0xFF03: ' ',
+   0xFF04: ' ',
+   0xFF05: ' ',
+   0xFF06: ' ',
+   0xFF07: ' ',
+   0xFF08: ' ',
+   0xFF09: ' ',
+   0xFF0A: ' ',
+   0xFF0B: ' ',
+   0xFF0C: ' ',
+   0xFF0D: ' ',
+   0xFF0E: ' ',
+   0xFF0F: ' ',
+   0xFF1A: ' ',
+   0xFF1B: ' ',
+   0xFF1C: ' ',
+   0xFF1D: ' ',
+   0xFF1E: ' ',
+   0xFF1F: ' ',
+   0xFF20: ' ',
+   0xFF3B: ' ',
+   0xFF3C: ' ',
+   0xFF3D: ' ',
+   0xFF3E: ' ',
+   0xFF3F: ' ',
+   0xFF40: ' ',
+   0xFF5B: ' ',
+   0xFF5C: ' ',
+   0xFF5D: ' ',
+   0xFF5E: ' ',
+   0xFF5F: ' ',
+   0xFF60: ' ',
+   0xFF61: ' ',
+   0xFF62: ' ',
+   0xFF63: ' ',
+   0xFF64: ' ',
+   0xFF65: ' ',
+   0x1039F: ' ',
+   0x103D0: ' ',
+   0x1091F: ' ',
+   0x11143: ' ',
+   0x12470: ' ',
+}
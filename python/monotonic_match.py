@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Align all transcriptions of a work to its sentences at once, using the fact that both are in reading order."""
+
+import numpy as np
+
+from normalize import normalizeSentences
+from similarity import partialRatios, combine
+from readings import readings
+
+shortlistSize = 50 # Sentences retrieved from the n-gram index for every transcription, anywhere in the work.
+bandFactor = 2 # The band around the diagonal spans this many sentences per transcription on either side.
+matchThreshold = 0.5 # Below this, a transcription is reported as unmatched.
+
+def bandLimits(t, numTrans, numSents):
+   """
+   " First and last (exclusive) sentence in the band of transcription t. Its width follows from
+   " the number of sentences per transcription, so the bands of consecutive transcriptions overlap.
+   """
+   step = numSents / max(numTrans, 1)
+   band = int(np.ceil(bandFactor * step))
+   centre = int(round(t * step))
+   return max(centre - band, 0), min(centre + band + 1, numSents)
+
+class PrefixMax:
+   """
+   " A Fenwick tree over the sentences holding the best (total, node) of the alignments ending on each one.
+   " Totals only ever increase, and query(s) returns the best over the sentences up to s, in O(log n).
+   """
+
+   def __init__(self, size):
+      self.totals = [-np.inf] * (size + 1)
+      self.nodes = [-1] * (size + 1)
+
+   def update(self, s, total, node):
+      i = s + 1
+      while i < len(self.totals):
+         if total > self.totals[i]:
+            self.totals[i] = total
+            self.nodes[i] = node
+         i += i & -i
+
+   def query(self, s):
+      total, node = -np.inf, -1
+      i = s + 1
+      while i > 0:
+         if self.totals[i] > total:
+            total, node = self.totals[i], self.nodes[i]
+         i -= i & -i
+      return total, node
+
+def candidates(t, normTrans, yomis, index, numTrans):
+   """
+   " The sentences transcription t may match, with their scores: those the n-gram index retrieves
+   " from the whole work, so that audio covering only part of the text still aligns, and those of
+   " its band around the diagonal, which catch transcriptions too garbled to be retrieved.
+   """
+   lo, hi = bandLimits(t, numTrans, len(index))
+   ids = np.union1d(
+      np.array(index.shortlist(normTrans[t], yomis[t], shortlistSize), dtype=np.int64),
+      np.arange(lo, hi)
+   )
+   p = partialRatios(normTrans[t], index.encodedSurfaces.take(ids))
+   q = partialRatios(yomis[t], index.encodedYomis.take(ids))
+   return ids, combine([p, q], [1, 0.75])
+
+def alignWork(transcriptions, index):
+   """
+   " Find the monotonic assignment of transcriptions to sentences with the best total score.
+   " Every transcription either matches a sentence scoring at least matchThreshold or is left
+   " unmatched, and the sentences matched never go backwards: consecutive transcriptions may stay
+   " on the same sentence or move forward by any number of sentences. The best total is found
+   " with a Fenwick tree over the sentences, so the path never goes through impossible cells.
+   " Return one (sentence index, sentence, score) triple per transcription, with (-1, "", score) for
+   " transcriptions left unmatched. Its first two items are the pair new_match.sentenceLevelMatch returns.
+   """
+   numTrans = len(transcriptions)
+   numSents = len(index)
+   if not (numTrans and numSents):
+      return [(-1, "", 0.0)] * numTrans
+
+   normTrans = normalizeSentences(transcriptions)
+   yomis = readings(transcriptions)
+
+   # Nodes are the matches alignments may go through: (transcription, sentence, score, previous node).
+   nodes = []
+   bestScores = [0.0] * numTrans
+   best = PrefixMax(numSents)
+   for t in range(numTrans):
+      ids, scores = candidates(t, normTrans, yomis, index, numTrans)
+      if len(scores):
+         bestScores[t] = float(scores.max())
+      row = []
+      for s, score in zip(ids.tolist(), scores.tolist()):
+         if score < matchThreshold:
+            continue
+         # Extend the best alignment ending on this sentence or before, if any.
+         total, previous = best.query(s)
+         if total == -np.inf:
+            total = 0.0
+         row.append((s, total + score, len(nodes) + len(row), previous, score))
+      # Only then add this transcription's matches, so that it matches one sentence at most.
+      for s, total, node, previous, score in row:
+         nodes.append((t, s, score, previous))
+         best.update(s, total, node)
+
+   matches = [(-1, "", score) for score in bestScores]
+   _, node = best.query(numSents - 1)
+   while node >= 0:
+      t, s, score, node = nodes[node]
+      matches[t] = (s, index.sentences[s], score)
+   return matches
@@ -2,101 +2,42 @@
 # -*- coding: utf-8 -*-
 """Try a new way of matching and aligning sentences by adding tags at appropriate places."""
 
-import re
-import sqlite3
+import argparse
 from pathlib import Path
-from multiprocessing import Pool
+from functools import partial
+from multiprocessing import Pool, get_context, get_all_start_methods
 
-import MeCab
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+import numpy as np
 
-from normalize import normalizeSentence as normalize
+from normalize import normalizeCached as normalize
+from corpus_index import CorpusIndex
+from similarity import ratios, partialRatios, combine, topK
+from monotonic_match import alignWork
+from readings import reading
+from segmenter import yieldSentenceSpans
+from sqlite_writer import BatchWriter, connect
 
 
-sentenceFinder = re.compile(r"(.*[。])")
+shortlistSize = 50 # Number of sentences retrieved from the n-gram index for fuzzy scoring.
+
 def splitStrippedText(textPath):
+   """Return the sentences of a stripped text as (start, end, sentence), split the same way as in fuzzy_match."""
    if textPath.is_file():
-      with textPath.resolve().open(mode="r") as st:
-         wholeText = st.read() # Luckily, none of the texts are too big to load into memory.
-      return sentenceFinder.findall(wholeText)
+      return list(yieldSentenceSpans(textPath.resolve()))
    else:
       return []
 
-def getSurfIndexes(cands, bestSurfCands):
-   """Regain the indices of the best surface candidates from the candidates."""
-   if not cands and bestSurfCands:
-      return []
-   enumSurfCands = enumerate(map(normalize, cands))
-
-   indexes = []
-   i = 0
-   for bsc in bestSurfCands:
-      for esc in enumSurfCands:
-         if bsc[0] == esc[1] and esc[0] not in indexes:
-            indexes.append(esc[0])
-            break
-      
-      enumSurfCands = enumerate(map(normalize, cands))
-
-   if len(indexes) == len(bestSurfCands):
-      return indexes
-   else:
-      raise RuntimeError
+def judgePairs(ids, surfScores, yomiScores, tInd, numTrans, numCands):
+   """Return the sentence id with the best sum of weighted scores."""
+   p = surfScores # Surface.
+   q = yomiScores # Pronunciation.
+   r = 100 * (1 - np.abs(tInd / numTrans - ids / numCands)) # Relative positions.
 
-yomiTagger = MeCab.Tagger("-Oyomi")
-def getYomiIndexes(cands, bestYomiCands):
-   """Regain the indices of the best reading candidates from the candidates."""
-   if not cands and bestYomiCands:
-      return []
-   enumYomiCands = enumerate(map(normalize, map(yomiTagger.parse, cands)))
-
-   indexes = []
-   i = 0
-   for byc in bestYomiCands:
-      for eyc in enumYomiCands:
-         if byc[0] == eyc[1] and eyc[0] not in indexes:
-            indexes.append(eyc[0])
-            break
-      
-      enumYomiCands = enumerate(map(normalize, map(yomiTagger.parse, cands)))
-
-   if len(indexes) == len(bestYomiCands):
-      return indexes
-   else:
-      raise RuntimeError
-
-def judgePairs(surfTriples, yomiTriples, tInd, numTrans, numCands):
-   """Return best surface form based on sum of weighted scores."""
-   surfTriples = sorted(surfTriples, key=lambda s: s[0])
-   yomiTriples = sorted(yomiTriples, key=lambda y: y[0])
-
-   # Check lengths for error.
-   if len(surfTriples) != len(yomiTriples):
-      raise RuntimeError
-
-   # Make sure that indices match.
-   for i, s in enumerate(surfTriples):
-      a = s[0]
-      b = yomiTriples[i][0]
-      if a != b:
-         raise RuntimeError
-
-   # Calculate the score for each pair and return the best surface form.
-   scores = []
-   for i, s in enumerate(surfTriples):
-      p = s[2] # Surface.
-      q = 0.75 * yomiTriples[i][2] # Pronunciation.
-      
-      t_rat = tInd / numTrans
-      c_rat = s[0] / numCands
-      r = 5 * (1 - abs(t_rat - c_rat)) # Relative positions.
-      
-      s = (p + q + r) / 180
-      scores.append(s)
-   return surfTriples[scores.index(max(scores))][0]
-
-def sentenceLevelMatch(trans, tInd, numTrans, cands):
+   # (p + 0.75 * q + 0.05 * r) / 180
+   scores = combine([p, q, r], [1, 0.75, 0.05])
+   return int(ids[np.argmax(scores)])
+
+def sentenceLevelMatch(trans, tInd, numTrans, index):
    """
     " Match a transcription to a sentence from the source text.
     " Use the following data.
@@ -107,59 +48,69 @@ def sentenceLevelMatch(trans, tInd, numTrans, cands):
    """
    # print(trans)
 
-   # Get surface candidates.
-   normCands = map(normalize, cands)
+   # Shortlist sentences sharing n-grams with the transcription.
    normTrans = normalize(trans)
-   bestSurfCands = process.extractBests(normTrans, normCands, scorer=fuzz.partial_ratio)
-   # print(bestSurfCands)
-   surfIndexes = getSurfIndexes(cands, bestSurfCands)
-   # print(surfIndexes)
-
-   # Get pronunciation candidates.
-   yomiCands = map(normalize, map(yomiTagger.parse, cands))
-   yomiTrans = normalize(yomiTagger.parse(trans))
-   bestYomiCands = process.extractBests(yomiTrans, yomiCands, scorer=fuzz.ratio)
-   # print(bestYomiCands)
-   yomiIndexes = getYomiIndexes(cands, bestYomiCands)
-   # print(yomiIndexes)
-
-   # Check indexes.
-   commonIndexes = set(surfIndexes) & set(yomiIndexes)
-   if len(commonIndexes) == 0:
+   yomiTrans = reading(trans)
+   shortlist = np.array(index.shortlist(normTrans, yomiTrans, shortlistSize), dtype=np.int64)
+
+   # Score the shortlist; positions in these arrays are positions in the shortlist.
+   surfScores = partialRatios(normTrans, index.encodedSurfaces.take(shortlist))
+   yomiScores = ratios(yomiTrans, index.encodedYomis.take(shortlist))
+
+   # Get surface and pronunciation candidates.
+   bestSurf, _ = topK(surfScores, 5)
+   bestYomi, _ = topK(yomiScores, 5)
+
+   # Check indexes, keeping the common ones in reading order.
+   common = np.intersect1d(bestSurf, bestYomi)
+   common = common[np.argsort(shortlist[common], kind="stable")]
+   if len(common) == 0:
       # Nothing found with confidence.
       return -1, ""
-   elif len(commonIndexes) == 1:
+   elif len(common) == 1:
       # Return the only common match's surface form.
-      commonSent = bestSurfCands[surfIndexes.index(commonIndexes.pop())][0]
-      for i, normCand in enumerate(map(normalize, cands)):
-         if normCand == commonSent:
-            return i, cands[i]
+      i = int(shortlist[common[0]])
+      return i, index.sentences[i]
    else:
       # Calculate weighted score for (surf, yomi) pairs.
       i = judgePairs(
-         [
-            s
-            for s in zip(
-               surfIndexes,
-               map(lambda bsc: bsc[0], bestSurfCands),
-               map(lambda bsc: bsc[1], bestSurfCands))
-            if s[0] in commonIndexes
-         ],
-         [
-            y
-            for y in zip(
-               yomiIndexes,
-               map(lambda byc: byc[0], bestYomiCands),
-               map(lambda byc: byc[1], bestYomiCands)
-            )
-            if y[0] in commonIndexes],
-            tInd,
-            numTrans,
-            len(cands)
+         shortlist[common],
+         surfScores[common],
+         yomiScores[common],
+         tInd,
+         numTrans,
+         len(index)
       )
-      return i, cands[i]
+      return i, index.sentences[i]
 
-def makeMatches(workPath):
+shardSize = 64 # Transcriptions per task handed to a worker.
+
+# The corpus index of the work being matched, set once in every worker.
+workerIndex = None
+def initWorker(index):
+   """Keep the corpus index in the worker. When forking it is shared with the parent rather than pickled."""
+   global workerIndex
+   workerIndex = index
+
+def matchShard(shard):
+   """Match a shard of (rowid, file_path, julius_transcription) rows against the worker's corpus index."""
+   rows, numTrans = shard
+   # Files registered by make_filelist but not transcribed yet have no transcription.
+   return [(r[1], sentenceLevelMatch(r[2] or "", r[0], numTrans, workerIndex)) for r in rows]
+
+def yieldShards(rows, numTrans):
+   """Split the rows of a work into shards."""
+   for i in range(0, len(rows), shardSize):
+      yield rows[i:i + shardSize], numTrans
+
+def makeMatches(workPath, mode="sentence", processes=None):
+   """
+   " Match every transcription of a work and save the results in its database.
+   " In "sentence" mode each transcription is searched for on its own, with the transcriptions
+   " sharded across a pool of processes sharing the work's corpus index; in "monotonic"
+   " mode all transcriptions are aligned to the sentences in one pass, in reading order.
+   " Either way, only this process writes to the database.
+   """
    if not workPath.is_dir(): return
 
    print(str(workPath.resolve()))
@@ -170,20 +121,11 @@ def makeMatches(workPath):
       return
 
    strippedTextPath = workPath / "stripped_text" / "stripped.txt"
-   cands = splitStrippedText(strippedTextPath)
-
-   with sqlite3.connect(str(dbPath.resolve())) as conn:
-      try:
-         conn.execute(
-            """
-               ALTER TABLE file_transcriptions
-               ADD COLUMN source_index INTEGER;
-            """
-         )
-      except sqlite3.OperationalError as e:
-         print(str(e) + f"; in {dbPath.resolve()}")
-         pass
+   index = CorpusIndex.fromSpans(splitStrippedText(strippedTextPath))
 
+   # Adds the source_index column to databases made before it existed.
+   conn = connect(dbPath.resolve())
+   try:
       maxRowId = conn.execute(
          """
             SELECT max(rowid)
@@ -198,27 +140,49 @@ def makeMatches(workPath):
             FROM file_transcriptions
             ORDER BY file_path;
          """
-      )
-      for r in results:
-         match = sentenceLevelMatch(r[2], r[0], numTrans, cands)
-         conn.execute(
-            """
-               UPDATE file_transcriptions
-               SET 
-                  source_index = ?,
-                  best_matches = ?
-               WHERE
-                  file_path = ?
-               ;
-            """,
-            (match[0], match[1] if match[1] else None, r[1])
-         )
-
-dataPath = Path("../data")
-pool = Pool()
-pool.map(makeMatches, dataPath.iterdir())
-pool.close()
-pool.join()
-
-# for p in dataPath.iterdir():
-#    makeMatches(p)
\ No newline at end of file
+      ).fetchall()
+
+      with BatchWriter(conn, ["source_index", "best_matches"]) as writer:
+         if mode == "monotonic":
+            matches = alignWork([r[2] or "" for r in results], index)
+            writeMatches(writer, [(r[1], m) for r, m in zip(results, matches)])
+         else:
+            # Fork so the workers share the index instead of each receiving a pickled copy.
+            context = get_context("fork" if "fork" in get_all_start_methods() else None)
+            with context.Pool(processes, initializer=initWorker, initargs=(index,)) as pool:
+               for matched in pool.imap(matchShard, yieldShards(results, numTrans)):
+                  writeMatches(writer, matched)
+   finally:
+      conn.close()
+
+def writeMatches(writer, matched):
+   """Save (file_path, (source_index, best_match)) pairs."""
+   writer.writeMany((path, m[0], m[1] if m[1] else None) for path, m in matched)
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Match transcriptions to the sentences of their works.")
+   parser.add_argument(
+      "-m", "--mode",
+      choices=["sentence", "monotonic"],
+      default="sentence",
+      help="Match transcriptions one by one or align them all in reading order."
+   )
+   parser.add_argument(
+      "-p", "--processes",
+      type=int,
+      default=None,
+      help="Number of worker processes per work, or of works aligned at once in monotonic mode (default: all cores)."
+   )
+   args = parser.parse_args()
+
+   dataPath = Path("../data")
+   works = sorted(dataPath.iterdir())
+   if args.mode == "monotonic":
+      # Aligning a work takes one core, so works are aligned side by side.
+      with Pool(args.processes) as pool:
+         for _ in pool.imap_unordered(partial(makeMatches, mode="monotonic"), works):
+            pass
+   else:
+      # Works are matched one after the other, each using every core.
+      for p in works:
+         makeMatches(p, mode=args.mode, processes=args.processes)
\ No newline at end of file
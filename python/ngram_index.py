@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Inverted index of character n-grams for quickly shortlisting candidate sentences."""
+
+from heapq import nsmallest
+from collections import Counter
+
+class NgramIndex:
+   """
+   " Map every character n-gram to the ids of the strings containing it.
+   " A query is answered by counting, for each id, how many of the query's
+   " n-grams appear in that string, so only the posting lists of the query's
+   " n-grams are ever touched.
+   """
+
+   def __init__(self, strings, sizes=(2, 3)):
+      self.sizes = tuple(sizes)
+      self.postings = {}
+      for i, s in enumerate(strings):
+         for gram in self.grams(s):
+            self.postings.setdefault(gram, []).append(i)
+
+   def grams(self, s):
+      """Return the set of n-grams of s. Strings too short for any n-gram are their own gram."""
+      grams = {s[i:i + n] for n in self.sizes for i in range(len(s) - n + 1)}
+      if not grams and s:
+         grams.add(s)
+      return grams
+
+   def counts(self, s):
+      """Count the n-grams shared between s and every indexed string that shares at least one."""
+      counts = Counter()
+      for gram in self.grams(s):
+         counts.update(self.postings.get(gram, ()))
+      return counts
+
+   def shortlist(self, s, limit):
+      """Return up to limit ids ranked by the number of shared n-grams."""
+      return [i for i, _ in rank(self.counts(s), limit)]
+
+def rank(counts, limit):
+   """Rank (id, count) pairs by descending count, breaking ties by reading order."""
+   return nsmallest(limit, counts.items(), key=lambda c: (-c[1], c[0]))
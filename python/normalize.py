@@ -3,9 +3,13 @@
 """Normalize a sentence."""
 
 import re
-from unicodedata import normalize
+from unicodedata import normalize, combining
+
+import numpy as np
 
 import create_mappings as maps
+import charclass
+from lru import LRUCache
 
 # def allAsciiToHalfwidth(sentence):
 #    """Convert all fullwidth ASCII in sentence to halfwidth."""
@@ -54,8 +58,93 @@ def deleteSpacesWithinJapanese(sentence):
       newSent = newSent.replace(substr, newSubstr)
    return newSent
 
-def normalizeSentence(sentence):
-   """Normalize a string by running through helper functions in order."""
+def startsSegment(char):
+   """Whether NFKC can never combine char with the character before it."""
+   if "\u1160" <= char <= "\u11FF": # Conjoining Hangul vowels and final consonants.
+      return False
+   return combining(normalize("NFKD", char)[:1] or char) == 0
+
+def normalizeWithSources(sentence):
+   """
+   " Apply NFKC segment by segment, where a segment is a character followed by
+   " anything that may combine with it, and return the result together with the
+   " index in sentence of the segment each normalized character came from.
+   """
+   pieces = []
+   sources = []
+   segStart = 0
+   for i in range(1, len(sentence) + 1):
+      if i == len(sentence) or startsSegment(sentence[i]):
+         piece = normalize("NFKC", sentence[segStart:i])
+         pieces.append(piece)
+         sources.extend([segStart] * len(piece))
+         segStart = i
+   newSent = "".join(pieces)
+
+   # Should never happen, but fall back to treating the sentence as one segment.
+   whole = normalize("NFKC", sentence)
+   if newSent != whole:
+      return whole, [0] * len(whole)
+   return newSent, sources
+
+#####
+# Fused normalization.
+#####
+
+def buildActionTable():
+   """
+   " Precompute what replacePunctuation and replaceNonAsciiKanaKanji do to every BMP character, for str.translate:
+   " punctuation and anything but ASCII, kana and kanji become a space, the rest is kept.
+   " Characters outside the BMP are left alone by the table; none of them are kept, so spaceRuns treats them as spaces.
+   """
+   kept = ((charclass.table & charclass.KEPT) != 0) & ((charclass.table & charclass.PUNCTUATION) == 0)
+   return np.where(kept, np.arange(0x10000), ord(" ")).tolist()
+
+actionTable = buildActionTable()
+
+# After the table, the only whitespace left is the ASCII space.
+spaceRuns = re.compile("[ \U00010000-\U0010FFFF]+")
+def keepRun(sentence, start, end):
+   """
+   " Whether a run of spaces, sentence[start:end], becomes a single space. Runs at the ends
+   " of the sentence and between two non-ASCII characters are deleted, the same as
+   " cleanWhitespace followed by deleteSpacesWithinJapanese and strip.
+   """
+   if start == 0 or end == len(sentence):
+      return False
+   return not (sentence[start - 1] > "\u007F" and sentence[end] > "\u007F")
+
+def collapseRun(match):
+   return " " if keepRun(match.string, match.start(), match.end()) else ""
+
+def normalizeSentenceWithOffsets(sentence):
+   """
+   " Normalize like normalizeSentence, but also return a list mapping every normalized
+   " character to the index of the character in sentence it came from.
+   " Punctuation and foreign characters are replaced one for one, so only NFKC and
+   " the whitespace handling change positions.
+   """
+   newSent, sources = normalizeWithSources(sentence)
+   newSent = newSent.translate(actionTable)
+
+   # Collapse whitespace, strip the ends and delete spaces within Japanese in one go.
+   pieces = []
+   charSources = []
+   pos = 0
+   for match in spaceRuns.finditer(newSent):
+      start, end = match.span()
+      pieces.append(newSent[pos:start])
+      charSources.extend(sources[pos:start])
+      if keepRun(newSent, start, end):
+         pieces.append(" ")
+         charSources.append(sources[start])
+      pos = end
+   pieces.append(newSent[pos:])
+   charSources.extend(sources[pos:])
+   return "".join(pieces), charSources
+
+def normalizeSentenceStepwise(sentence):
+   """Normalize a string by running through helper functions in order. The reference for normalizeSentence."""
    sentence = normalize("NFKC", sentence)
    # sentence = normalizeAscii(sentence)
    # sentence = allJapaneseToFullwidth(sentence)
@@ -64,3 +153,56 @@ def normalizeSentence(sentence):
    sentence = cleanWhitespace(sentence)
    sentence = deleteSpacesWithinJapanese(sentence)
    return sentence.strip()
+
+def normalizeSentence(sentence, offsets=False):
+   """
+   " Normalize a string: NFKC, then punctuation and anything but ASCII, kana and kanji become spaces,
+   " then whitespace is collapsed, stripped and deleted within Japanese. The replacements are one
+   " lookup table and the whitespace handling one regex pass, see normalizeSentenceStepwise for the steps.
+   " With offsets, return the index in the original of every normalized character too.
+   """
+   if offsets:
+      return normalizeSentenceWithOffsets(sentence)
+   return spaceRuns.sub(collapseRun, normalize("NFKC", sentence).translate(actionTable))
+
+#####
+# Many strings at once.
+#####
+
+memoSize = 100000 # Most normalized strings remembered by the memo.
+memo = LRUCache(memoSize) # Per process; forked workers start with a copy of the parent's.
+
+def normalizeSentences(sentences, offsets=False, useMemo=False):
+   """
+   " Normalize a sequence of strings, returning a list of the results in order.
+   " With offsets, every result is a (normalized, sources) pair as from normalizeSentence.
+   " With useMemo, strings normalized before are looked up instead, and the results are remembered.
+   """
+   sentences = list(sentences)
+   if offsets:
+      return [normalizeSentenceWithOffsets(s) for s in sentences]
+
+   results = []
+   for s in sentences:
+      normalized = memo.get(s) if useMemo else None
+      if normalized is None:
+         normalized = normalizeSentence(s)
+         if useMemo:
+            memo.put(s, normalized)
+      results.append(normalized)
+   return results
+
+def normalizeSpans(text, spans, offsets=False, useMemo=False):
+   """
+   " Normalize the (start, end) spans of a single buffer. A str is sliced by characters, while
+   " UTF-8 bytes or a memory map are sliced by bytes, e.g. with the spans from segmenter.yieldFileSpans.
+   """
+   if isinstance(text, str):
+      pieces = (text[start:end] for start, end in spans)
+   else:
+      pieces = (text[start:end].decode("utf-8") for start, end in spans)
+   return normalizeSentences(pieces, offsets, useMemo)
+
+def normalizeCached(sentence):
+   """Normalize a single string through the memo."""
+   return normalizeSentences([sentence], useMemo=True)[0]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Index sentences by how they sound, so that a transcription with the wrong kanji still finds them."""
+
+import re
+
+from ngram_index import NgramIndex
+
+moraGramSizes = (2, 3) # Lengths of the mora n-grams indexed.
+firstCombined = 0xE000 # Start of the Private Use Area, where the morae written with two kana are folded to.
+
+# ヲ reads like オ, ヂ/ヅ like ジ/ズ, and ヴ like ブ.
+sameSound = {"ヲ": "オ", "ヂ": "ジ", "ヅ": "ズ", "ヴ": "ブ"}
+# Voiced and semi-voiced kana are folded onto the unvoiced ones.
+unvoiced = dict(zip(
+   "ガギグゲゴザジズゼゾダデドバビブベボパピプペポ",
+   "カキクケコサシスセソタテトハヒフヘホハヒフヘホ"
+))
+vowels = dict(
+   [(k, "ア") for k in "アカサタナハマヤラワ"] +
+   [(k, "イ") for k in "イキシチニヒミリ"] +
+   [(k, "ウ") for k in "ウクスツヌフムユル"] +
+   [(k, "エ") for k in "エケセテネヘメレ"] +
+   [(k, "オ") for k in "オコソトノホモヨロ"]
+)
+# A kana followed by a small one is a single mora (キャ, シュ, ティ, ファ...), given a character of its own
+# so that n-grams still count morae and キャ doesn't read like キヤ. Other small kana read like large ones.
+glides = dict(zip("ァィゥェォャュョ", "アイウエオアウオ"))
+smallToLarge = dict(zip("ァィゥェォャュョヮヵヶ", "アイウエオヤユヨワカケ"))
+combined = {
+   base + glide: chr(firstCombined + i)
+   for i, (base, glide) in enumerate((b, g) for b in vowels for g in glides)
+}
+moraVowels = {**vowels, **{c: glides[k[1]] for k, c in combined.items()}}
+combinedPattern = re.compile("[{}][{}]".format("".join(vowels), "".join(glides)))
+sameSoundTable = str.maketrans(sameSound)
+unvoicedTable = str.maketrans(unvoiced)
+smallTable = str.maketrans(smallToLarge)
+
+def toKatakana(s):
+   """Convert hiragana to katakana, leaving everything else alone."""
+   return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in s)
+
+def fold(reading):
+   """
+   " Reduce a reading to one character per mora, dropping the distinctions Julius and MeCab often disagree on:
+   " voicing marks are removed, the sokuon (ッ) is dropped and long vowels (ー, or a vowel repeating
+   " the one before it, including おう and えい) are merged into the previous mora. A kana and the small one
+   " after it become one character; other small kana become large. Characters other than kana are kept as they are.
+   """
+   kana = toKatakana(reading).replace("ッ", "").replace("ー", "").translate(sameSoundTable).translate(unvoicedTable)
+   kana = combinedPattern.sub(lambda m: combined[m.group()], kana).translate(smallTable)
+   out = []
+   previousVowel = None
+   for c in kana:
+      if c in "アイウエオ" and previousVowel is not None and (
+         c == previousVowel or
+         (previousVowel == "オ" and c == "ウ") or
+         (previousVowel == "エ" and c == "イ")
+      ):
+         # Long vowel.
+         continue
+      out.append(c)
+      previousVowel = moraVowels.get(c)
+   return "".join(out)
+
+class PhoneticIndex:
+   """
+   " An n-gram index over the folded readings of a list of sentences.
+   " Answering a query only touches the posting lists of the query's mora n-grams.
+   """
+
+   def __init__(self, readings, sizes=moraGramSizes):
+      self.folded = [fold(r) for r in readings]
+      self.grams = NgramIndex(self.folded, sizes)
+
+   def __len__(self):
+      return len(self.folded)
+
+   def counts(self, reading):
+      """Count the mora n-grams shared between a reading and every sentence sharing at least one."""
+      return self.grams.counts(fold(reading))
+
+   def shortlist(self, reading, limit=50):
+      """Return up to limit ids of the sentences sounding most like the reading."""
+      return self.grams.shortlist(fold(reading), limit)
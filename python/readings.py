@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Get the normalized readings (yomi) of strings from MeCab, keeping the taggers and previous results around."""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+import MeCab
+
+import normalize as normalizer
+from normalize import normalizeSentence as normalize
+from create_mappings import mappingsVersion
+from lru import LRUCache
+
+cacheSize = 100000 # Most results kept in memory.
+# Results kept across runs, shared by all processes, next to this module whatever the working directory. None to disable.
+diskCachePath = str(Path(__file__).resolve().parent / "readings.db")
+busyTimeout = 60 # Seconds to wait for another process holding the disk cache.
+batchSize = 500 # Keys per lookup in the disk cache.
+
+# MeCab taggers are not safe to share between threads, nor across a fork,
+# so every thread of every process gets its own.
+local = threading.local()
+def tagger(options=""):
+   """Return this thread's tagger for the given options, creating it on first use."""
+   if getattr(local, "pid", None) != os.getpid():
+      local.pid = os.getpid()
+      local.taggers = {}
+   if options not in local.taggers:
+      local.taggers[options] = MeCab.Tagger(options)
+   return local.taggers[options]
+
+def parseMorphemes(sentence):
+   """
+   " Split a sentence into MeCab morphemes and line up their surface spans with their reading spans.
+   " Return the normalized reading of the whole sentence, the (start, end) offsets of every
+   " morpheme in the sentence and the boundaries of the morphemes in the reading,
+   " i.e. morpheme k reads as reading[yomiBounds[k]:yomiBounds[k + 1]].
+   """
+   surfaceSpans = []
+   yomiBounds = [0]
+   pieces = []
+   pos = 0
+   node = tagger().parseToNode(sentence)
+   while node:
+      surface = node.surface
+      if surface: # Skip BOS/EOS.
+         # MeCab skips whitespace between morphemes, so look for the surface from where we are.
+         start = sentence.find(surface, pos)
+         if start < 0:
+            start = pos
+         end = start + len(surface)
+
+         # Unknown words have no reading, so read them as they are written (like -Oyomi).
+         fields = node.feature.split(",")
+         yomi = normalize(fields[7] if len(fields) > 7 and fields[7] != "*" else surface)
+
+         surfaceSpans.append((start, end))
+         pieces.append(yomi)
+         yomiBounds.append(yomiBounds[-1] + len(yomi))
+         pos = end
+      node = node.next
+   return "".join(pieces), surfaceSpans, yomiBounds
+
+def parseReading(text):
+   """Normalized reading of a string according to MeCab's -Oyomi output."""
+   return normalize(tagger("-Oyomi").parse(text))
+
+def dictionaryIdentity():
+   """Describe the dictionaries used by MeCab, so that results from another dictionary are never reused."""
+   parts = []
+   d = tagger().dictionary_info()
+   while d:
+      parts.append("{}:{}:{}:{}".format(d.filename, d.version, d.charset, d.size))
+      d = d.next
+   return "|".join(parts)
+
+def normalizerIdentity():
+   """
+   " Describe the normalization applied to the readings: the mappings version and a hash of the code
+   " of normalize.py and of the modules its table is built from, so any change to them invalidates the results.
+   """
+   h = hashlib.sha1()
+   for module in ("normalize.py", "charclass.py", "mapping_tables.py"):
+      h.update((Path(normalizer.__file__).resolve().parent / module).read_bytes())
+   return "mappings:{}:normalize:{}".format(mappingsVersion, h.hexdigest())
+
+class DiskCache:
+   """
+   " Results stored in SQLite, keyed by a hash of the kind of result, the text, the MeCab dictionary
+   " and the normalizer.
+   " The database is in WAL mode so that pool workers can read while one of them writes,
+   " and waits on locks rather than failing. Every thread of every process has its own connection.
+   """
+
+   def __init__(self, path):
+      self.path = path
+      self.local = threading.local()
+      self.lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+      self.identity = None
+
+   def connection(self):
+      if getattr(self.local, "pid", None) != os.getpid():
+         conn = sqlite3.connect(self.path, timeout=busyTimeout)
+         conn.execute("PRAGMA busy_timeout = {};".format(int(busyTimeout * 1000)))
+         conn.execute("PRAGMA journal_mode = WAL;")
+         conn.execute("PRAGMA synchronous = NORMAL;")
+         conn.execute(
+            """
+               CREATE TABLE IF NOT EXISTS readings (
+                  key TEXT PRIMARY KEY,
+                  value TEXT NOT NULL
+               )
+               ;
+            """
+         )
+         conn.commit()
+         self.local.pid = os.getpid()
+         self.local.conn = conn
+      return self.local.conn
+
+   def key(self, kind, text):
+      if self.identity is None:
+         self.identity = dictionaryIdentity() + "|" + normalizerIdentity()
+      h = hashlib.sha1()
+      for part in (self.identity, kind, text):
+         h.update(part.encode("utf-8"))
+         h.update(b"\0")
+      return h.hexdigest()
+
+   def getMany(self, kind, texts):
+      """Return a dict of the stored results of those texts that have one."""
+      keys = {self.key(kind, t): t for t in texts}
+      found = {}
+      conn = self.connection()
+      allKeys = list(keys)
+      for i in range(0, len(allKeys), batchSize):
+         chunk = allKeys[i:i + batchSize]
+         rows = conn.execute(
+            "SELECT key, value FROM readings WHERE key IN ({});".format(",".join("?" * len(chunk))),
+            chunk
+         )
+         for k, v in rows:
+            found[keys[k]] = json.loads(v)
+      with self.lock:
+         self.hits += len(found)
+         self.misses += len(keys) - len(found)
+      return found
+
+   def putMany(self, kind, results):
+      """Store (text, result) pairs in a single transaction."""
+      if not results:
+         return
+      conn = self.connection()
+      with conn:
+         conn.executemany(
+            "INSERT OR IGNORE INTO readings (key, value) VALUES (?, ?);",
+            [(self.key(kind, t), json.dumps(v, ensure_ascii=False)) for t, v in results]
+         )
+
+   def info(self):
+      with self.lock:
+         return {"hits": self.hits, "misses": self.misses, "path": self.path}
+
+cache = LRUCache(cacheSize)
+diskCache = None
+parses = 0
+
+def getDiskCache():
+   """The disk cache at diskCachePath, or None if it is disabled."""
+   global diskCache
+   if diskCachePath is None:
+      return None
+   if diskCache is None or diskCache.path != diskCachePath:
+      diskCache = DiskCache(diskCachePath)
+   return diskCache
+
+def cachedMany(kind, texts, parse, load=lambda v: v):
+   """
+   " Look results up in memory, then on disk, and only parse what neither has.
+   " load turns a result read back from disk (JSON) into what parse returns.
+   """
+   results = {}
+   missing = []
+   for t in texts:
+      value = cache.get((kind, t))
+      if value is None:
+         if t not in results:
+            missing.append(t)
+            results[t] = None
+      else:
+         results[t] = value
+
+   if missing:
+      disk = getDiskCache()
+      stored = disk.getMany(kind, missing) if disk is not None else {}
+      parsed = []
+      for t in missing:
+         if t in stored:
+            value = load(stored[t])
+         else:
+            value = parse(t)
+            parsed.append((t, value))
+         cache.put((kind, t), value)
+         results[t] = value
+      if parsed:
+         global parses
+         parses += len(parsed)
+         if disk is not None:
+            disk.putMany(kind, parsed)
+
+   return [results[t] for t in texts]
+
+def reading(text):
+   """Normalized reading of a string."""
+   return cachedMany("yomi", [text], parseReading)[0]
+
+def readings(texts):
+   """Normalized readings of a sequence of strings, in order."""
+   return cachedMany("yomi", list(texts), parseReading)
+
+def loadMorphemes(value):
+   yomi, surfaceSpans, yomiBounds = value
+   return yomi, [tuple(span) for span in surfaceSpans], yomiBounds
+
+def morphemes(sentence):
+   """The reading of a sentence together with its morpheme spans, as returned by parseMorphemes."""
+   return cachedMany("morphemes", [sentence], parseMorphemes, loadMorphemes)[0]
+
+def morphemesMany(sentences):
+   """morphemes for a sequence of sentences, in order."""
+   return cachedMany("morphemes", list(sentences), parseMorphemes, loadMorphemes)
+
+def cacheInfo():
+   """Hit and miss counters of the memory and disk caches, and the number of strings MeCab had to parse."""
+   disk = getDiskCache()
+   return {
+      "memory": cache.info(),
+      "disk": disk.info() if disk is not None else None,
+      "parses": parses
+   }
+
+def clearCache():
+   """Forget the results held in memory; the disk cache is kept."""
+   cache.clear()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Append-only, checkpointed store of match results so that long runs can be resumed."""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+def textHash(text):
+   """Short hash of a string."""
+   return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def fingerprint(paths, parameters):
+   """Hash the contents of the given files together with the matcher parameters."""
+   h = hashlib.sha1()
+   for path in paths:
+      with open(path, "rb") as f:
+         for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+   h.update(json.dumps(parameters, sort_keys=True).encode("utf-8"))
+   return h.hexdigest()
+
+class ResultsStore:
+   """
+   " Results are appended as JSON lines, {"id", "key", "text", "match"}, and written out in batches.
+   " The key identifies the corpus and matcher parameters of the run and "text" is a hash of the
+   " transcription, so an entry is only reused if neither has changed since it was written.
+   " Later lines win, and a line cut short by a crash is ignored.
+   """
+
+   def __init__(self, path, key, batchSize=100):
+      self.path = Path(path)
+      self.key = key
+      self.batchSize = batchSize
+      self.pending = []
+      self.entries = {}
+      cutShort = False
+      if self.path.is_file():
+         with self.path.open("r") as f:
+            for line in f:
+               cutShort = not line.endswith("\n")
+               try:
+                  entry = json.loads(line)
+               except json.JSONDecodeError:
+                  continue
+               self.entries[entry["id"]] = entry
+      self.out = self.path.open("a")
+      if cutShort:
+         # Don't glue the next batch onto a partial line.
+         self.out.write("\n")
+
+   def get(self, tid, transcription):
+      """Return the stored match for a transcription, or None if it is missing or stale."""
+      entry = self.entries.get(tid)
+      if entry is None or entry["key"] != self.key or entry["text"] != textHash(transcription):
+         return None
+      return entry["match"]
+
+   def put(self, tid, transcription, match):
+      """Record a match, committing to disk once a batch is full."""
+      entry = {"id": tid, "key": self.key, "text": textHash(transcription), "match": match}
+      self.entries[tid] = entry
+      self.pending.append(entry)
+      if len(self.pending) >= self.batchSize:
+         self.flush()
+
+   def flush(self):
+      """Commit the pending batch to disk."""
+      if not self.pending:
+         return
+      self.out.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self.pending))
+      self.out.flush()
+      os.fsync(self.out.fileno())
+      self.pending = []
+
+   def close(self):
+      self.flush()
+      self.out.close()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc):
+      self.close()
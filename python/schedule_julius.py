@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+" Transcribe every pending file of split_audio with a fixed number of Julius servers, each given a shard
+" of about the same total audio duration, whatever the works the files come from.
+" Usage: python schedule_julius.py -w 8
+"""
+
+import os
+import sys
+import wave
+import heapq
+import sqlite3
+import argparse
+from pathlib import Path
+
+from call_julius import workDatabase
+from julius_supervisor import main
+from serve_julius import makeCommand
+
+dataPath = Path("../data")
+shardDir = Path("./shards")
+firstPort = 20000
+bytesPerSecond = 16000 * 2 # 16 kHz, 16 bit mono, as written by split_audio_on_silence.py.
+
+def transcribed(dbPath):
+   """The files of a work's database that already have a transcription."""
+   if not dbPath.is_file():
+      return set()
+   with sqlite3.connect(str(dbPath)) as conn:
+      try:
+         rows = conn.execute(
+            """
+               SELECT file_path
+               FROM file_transcriptions
+               WHERE julius_transcription IS NOT NULL;
+            """
+         ).fetchall()
+      except sqlite3.OperationalError:
+         return set()
+   return {r[0] for r in rows}
+
+def yieldPending(dataPath, everything=False):
+   """Yield the WAVs of every work's split_audio lacking a transcription (all of them if everything)."""
+   for work in sorted(dataPath.iterdir()):
+      soundDir = work / "split_audio"
+      if not soundDir.is_dir():
+         continue
+      done = set() if everything else transcribed((work / "data.db").resolve())
+      for soundFile in sorted(soundDir.iterdir()):
+         path = str(soundFile.resolve())
+         if soundFile.is_file() and soundFile.suffix == ".wav" and path not in done:
+            yield path
+
+def duration(path):
+   """The duration of a WAV in seconds, from its header, or estimated from its size if it can't be read."""
+   try:
+      with wave.open(path, "rb") as w:
+         return w.getnframes() / w.getframerate()
+   except (wave.Error, EOFError):
+      return os.path.getsize(path) / bytesPerSecond
+
+def balance(durations, shards):
+   """
+   " Split {path: duration} into shards of about the same total duration with the longest processing time rule:
+   " take the files from longest to shortest and give each to the shard with the least audio so far.
+   " The total of the longest shard is at most 4/3 of the best possible. Return lists of paths and their totals.
+   """
+   heap = [(0.0, i) for i in range(shards)]
+   assigned = [[] for _ in range(shards)]
+   for path in sorted(durations, key=lambda p: (-durations[p], p)):
+      total, i = heapq.heappop(heap)
+      assigned[i].append(path)
+      heapq.heappush(heap, (total + durations[path], i))
+   totals = [0.0] * shards
+   for total, i in heap:
+      totals[i] = total
+   # Files of the same work close together in each shard.
+   return [sorted(paths) for paths in assigned], totals
+
+def writeShards(assigned, shardDir):
+   """Write every shard as a filelist for Julius, replacing the shards of previous runs."""
+   shardDir.mkdir(exist_ok=True)
+   for old in shardDir.glob("shard_*.txt"):
+      old.unlink()
+   filelists = []
+   for i, paths in enumerate(assigned):
+      filelist = (shardDir / f"shard_{i:03}.txt").resolve()
+      filelist.write_text("".join(p + "\n" for p in paths))
+      filelists.append(filelist)
+   return filelists
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Transcribe pending split audio with a fixed pool of Julius servers.")
+   parser.add_argument(
+      "-w", "--workers",
+      type=int,
+      default=os.cpu_count(),
+      help="Number of Julius servers (default: all cores)."
+   )
+   parser.add_argument("-p", "--port", type=int, default=firstPort, help="Port of the first server.")
+   parser.add_argument("-a", "--all", action="store_true", help="Transcribe files already transcribed too.")
+   parser.add_argument("-n", "--dry-run", action="store_true", help="Only write and print the shards.")
+   args = parser.parse_args()
+
+   durations = {path: duration(path) for path in yieldPending(dataPath, args.all)}
+   if not durations:
+      print("Nothing to transcribe.")
+      sys.exit(0)
+
+   # With no more shards than files, none is empty.
+   assigned, totals = balance(durations, min(args.workers, len(durations)))
+   filelists = writeShards(assigned, shardDir)
+   for filelist, paths, total in zip(filelists, assigned, totals):
+      print(f"{filelist.name}: {len(paths)} files, {total / 3600:.2f} h")
+   print("{} files, {:.2f} h of audio, longest shard {:.2f} h over a mean of {:.2f} h.".format(
+      len(durations), sum(totals) / 3600, max(totals) / 3600, sum(totals) / len(totals) / 3600
+   ))
+   if args.dry_run:
+      sys.exit(0)
+
+   jobs = list(enumerate(filelists, args.port))
+   unfinished = main(jobs, makeCommand, route=workDatabase)
+   for report in unfinished:
+      print(f"{report['filelist']}: {report['done']} of {report['files']} files transcribed.")
+   sys.exit(1 if unfinished else 0)
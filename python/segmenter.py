@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Split a stripped text into sentences, scanning the memory-mapped file rather than building strings one character at a time."""
+
+import re
+import mmap
+
+defaultDelimiters = frozenset({"\n", "。"}) # {"\n", "。", "　", "、"}
+
+def delimiterPattern(delimiters):
+   """A bytes regex matching any of the delimiters in UTF-8. UTF-8 never matches in the middle of a character."""
+   encoded = sorted((d.encode("utf-8") for d in delimiters), key=len, reverse=True)
+   return re.compile(b"|".join(map(re.escape, encoded)))
+
+def yieldSpans(buffer, delimiters=defaultDelimiters):
+   """
+   " Yield the (start, end) byte offsets of the sentences of a UTF-8 buffer (bytes, mmap, ...).
+   " A sentence ends with, and includes, a delimiter; pieces made of a delimiter alone are skipped.
+   " Trailing text without a delimiter is a sentence too.
+   """
+   start = 0
+   for m in delimiterPattern(delimiters).finditer(buffer):
+      if m.start() > start:
+         yield start, m.end()
+      start = m.end()
+   if len(buffer) > start:
+      yield start, len(buffer)
+
+def mapFile(path):
+   """Memory-map a file for reading. Empty files, which can't be mapped, give empty bytes."""
+   with open(path, "rb") as f:
+      try:
+         return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+         return b""
+
+def yieldFileSpans(path, delimiters=defaultDelimiters):
+   """Yield the (start, end) byte offsets of the sentences of a file."""
+   buffer = mapFile(path)
+   try:
+      yield from yieldSpans(buffer, delimiters)
+   finally:
+      if isinstance(buffer, mmap.mmap):
+         buffer.close()
+
+def yieldSentenceSpans(path, delimiters=defaultDelimiters):
+   """
+   " Yield the sentences of a file as (start, end, sentence), with start and end in characters,
+   " i.e. offsets into the decoded text. Only the sentences themselves are decoded.
+   """
+   buffer = mapFile(path)
+   try:
+      charPos = 0
+      bytePos = 0
+      for start, end in yieldSpans(buffer, delimiters):
+         if start > bytePos:
+            # Skipped delimiters.
+            charPos += len(buffer[bytePos:start].decode("utf-8"))
+         sentence = buffer[start:end].decode("utf-8")
+         yield charPos, charPos + len(sentence), sentence
+         charPos += len(sentence)
+         bytePos = end
+   finally:
+      if isinstance(buffer, mmap.mmap):
+         buffer.close()
@@ -1,12 +1,12 @@
 #!/usr/local/env python3
 # -*- coding: utf-8 -*-
-"""Runs a Julius server for each work on a different port."""
+"""Runs a Julius server for each work on a different port and reads them all from this process, under supervision."""
 
+import sys
 from pathlib import Path
 from subprocess import run
-from multiprocessing import Pool
 
-from call_julius import main
+from julius_supervisor import main
 
 juliusPath = Path("../julius")
 dictationKit = juliusPath / "dictation-kit"
@@ -28,13 +28,11 @@ def makeCommand(port, filelist):
 
    return command
 
-filelists = Path("./filelists").resolve()
-mainArgs = []
-for port, filelist in enumerate(sorted(filelists.iterdir()), 20000):
-   command = makeCommand(port, str(filelist.resolve()))
-   mainArgs.append((command, port, filelist.resolve()))
+if __name__ == "__main__":
+   filelists = Path("./filelists").resolve()
+   jobs = [(port, filelist.resolve()) for port, filelist in enumerate(sorted(filelists.iterdir()), 20000)]
 
-pool = Pool()
-pool.map(main, mainArgs)
-pool.close()
-pool.join()
+   unfinished = main(jobs, makeCommand)
+   for report in unfinished:
+      print(f"{report['filelist']}: {report['done']} of {report['files']} files transcribed.")
+   sys.exit(1 if unfinished else 0)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Score queries against many candidates at once using bit-parallel edit distances over codepoint arrays."""
+
+import numpy as np
+
+WORD = 64
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+HIGH_BIT = np.uint64(WORD - 1)
+ONE = np.uint64(1)
+
+################################
+# Encoding strings as numbers. #
+################################
+
+class Encoded:
+   """A batch of strings as a (-1)-padded matrix of codepoints plus their lengths."""
+
+   def __init__(self, codes, lengths):
+      self.codes = codes
+      self.lengths = lengths
+
+   def __len__(self):
+      return len(self.lengths)
+
+   def take(self, ids):
+      """Return the encoded strings at the given ids, dropping the padding none of them need."""
+      ids = np.asarray(ids, dtype=np.int64)
+      lengths = self.lengths[ids]
+      width = max(int(lengths.max()) if len(ids) else 0, 1)
+      return Encoded(self.codes[ids, :width], lengths)
+
+def codepoints(s):
+   """Encode a single string as a 1-D array of codepoints."""
+   return np.frombuffer(s.encode("utf-32-le"), dtype="<u4").astype(np.int32)
+
+def encode(strings):
+   """Encode a sequence of strings without looping over their characters in Python."""
+   if isinstance(strings, Encoded):
+      return strings
+   strings = list(strings)
+   lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+   width = max(int(lengths.max()) if len(strings) else 0, 1)
+   codes = np.full((len(strings), width), -1, dtype=np.int32)
+
+   # Scatter the concatenated codepoints into their rows.
+   flat = codepoints("".join(strings))
+   rows = np.repeat(np.arange(len(strings)), lengths)
+   starts = np.cumsum(lengths) - lengths
+   cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+   codes[rows, cols] = flat
+   return Encoded(codes, lengths)
+
+#####################
+# Bit-vector tools. #
+#####################
+
+def numWords(length):
+   """Number of 64-bit words needed to hold length bits."""
+   return max((int(length) + WORD - 1) // WORD, 1)
+
+def packMasks(matches, words):
+   """Pack an (N, L) boolean matrix into (N, words) little-endian uint64 bit vectors."""
+   padded = np.zeros((matches.shape[0], words * WORD), dtype=bool)
+   padded[:, :matches.shape[1]] = matches
+   return np.packbits(padded, axis=1, bitorder="little").view("<u8")
+
+def lowMasks(lengths, words):
+   """Bit vectors with the lowest length bits set, one per row."""
+   bits = np.clip(lengths[:, None] - WORD * np.arange(words)[None, :], 0, WORD).astype(np.uint64)
+   partial = (np.left_shift(ONE, np.minimum(bits, HIGH_BIT)) - ONE)
+   return np.where(bits == WORD, ALL_ONES, partial)
+
+if hasattr(np, "bitwise_count"):
+   def popcount(x):
+      """Count the set bits of every row of an (N, words) uint64 matrix."""
+      return np.bitwise_count(x).sum(axis=1, dtype=np.int64)
+else:
+   byteCounts = np.array([bin(b).count("1") for b in range(256)], dtype=np.int64)
+   def popcount(x):
+      """Count the set bits of every row of an (N, words) uint64 matrix."""
+      return byteCounts[np.ascontiguousarray(x).view(np.uint8)].sum(axis=1)
+
+def addWithCarry(a, b):
+   """Add (N, words) bit vectors as multi-word integers."""
+   out = np.empty_like(a)
+   carry = np.zeros(a.shape[0], dtype=np.uint64)
+   for k in range(a.shape[1]):
+      s = a[:, k] + b[:, k]
+      c = (s < a[:, k]).astype(np.uint64)
+      t = s + carry
+      carry = c | (t < s).astype(np.uint64)
+      out[:, k] = t
+   return out
+
+##############################################
+# Equality masks for the two ways of pairing. #
+##############################################
+
+def yieldCandidateMasks(candidates, text):
+   """
+   " Candidates are the patterns and the (single) text is walked through.
+   " Yield, for every text character, the positions of that character in each candidate.
+   """
+   words = numWords(candidates.codes.shape[1])
+   cache = {}
+   for c in text.tolist():
+      if c not in cache:
+         cache[c] = packMasks(candidates.codes == c, words)
+      yield cache[c], None
+
+def yieldQueryMasks(pattern, candidates):
+   """
+   " The (single) pattern is matched against every candidate used as a text.
+   " Yield, for every candidate column, the positions of that column's characters in the pattern
+   " and which rows still have text left.
+   """
+   words = numWords(len(pattern))
+   alphabet, inverse = np.unique(pattern, return_inverse=True)
+   table = np.zeros((len(alphabet) + 1, words), dtype=np.uint64)
+   for symbol in range(len(alphabet)):
+      table[symbol] = packMasks((inverse.ravel() == symbol)[None, :], words)[0]
+
+   # Look every candidate character up in the pattern's alphabet once; misses get the empty mask.
+   codes = candidates.codes
+   if len(alphabet):
+      found = np.minimum(np.searchsorted(alphabet, codes), len(alphabet) - 1)
+      symbols = np.where(alphabet[found] == codes, found, len(alphabet))
+   else:
+      symbols = np.zeros(codes.shape, dtype=np.int64)
+
+   for j in range(codes.shape[1]):
+      yield table[symbols[:, j]], j < candidates.lengths
+
+####################
+# Bit-parallel DP. #
+####################
+
+def lcsLengths(steps, lengths, words):
+   """Length of the longest common subsequence between each pattern and the text (Allison-Dix)."""
+   V = np.broadcast_to(ALL_ONES, (len(lengths), words)).copy()
+   for Eq, active in steps:
+      U = V & Eq
+      newV = addWithCarry(V, U) | (V & ~Eq)
+      V = newV if active is None else np.where(active[:, None], newV, V)
+   return lengths - popcount(V & lowMasks(lengths, words))
+
+def advanceBlocks(Pv, Mv, Eq, hinStart, noHin):
+   """
+   " Advance Myers' algorithm by one text character over every block (word) of the patterns.
+   " Pv and Mv, lists of one array per word, are updated in place.
+   " Return the horizontal deltas (Ph, Mh) of every block before shifting.
+   """
+   hinPos = hinStart
+   hinNeg = noHin
+   PhAll = []
+   MhAll = []
+   words = len(Pv)
+   for k in range(words):
+      pv = Pv[k]
+      mv = Mv[k]
+      eq = Eq[:, k]
+      Xv = eq | mv
+      if k:
+         eq = eq | hinNeg
+      Xh = (((eq & pv) + pv) ^ pv) | eq
+      Ph = mv | ~(Xh | pv)
+      Mh = pv & Xh
+      PhAll.append(Ph)
+      MhAll.append(Mh)
+      if k + 1 < words:
+         houtPos = Ph >> HIGH_BIT
+         houtNeg = Mh >> HIGH_BIT
+      Ph = (Ph << ONE) | hinPos
+      Mh = Mh << ONE
+      if k:
+         Mh |= hinNeg
+      Pv[k] = Mh | ~(Xv | Ph)
+      Mv[k] = Ph & Xv
+      if k + 1 < words:
+         hinPos, hinNeg = houtPos, houtNeg
+   return PhAll, MhAll
+
+def editDistances(steps, lengths, words, freeStart=True, keepAll=False):
+   """
+   " Myers' bit-parallel edit distance between each pattern and the text, block by block.
+   " With freeStart, the pattern may start anywhere in the text (semi-global alignment);
+   " otherwise it is aligned from the first text character.
+   " Returns the best distance over all text end positions and the step (+ 1) where it was reached,
+   " and, with keepAll, the distance after every step.
+   " Rows whose text has run out keep being updated, but nothing past their end is recorded.
+   """
+   n = len(lengths)
+   last = np.maximum(lengths - 1, 0)
+   uniform = n == 0 or bool((last == last[0]).all())
+   if uniform:
+      lastWord = int(last[0]) // WORD if n else 0
+      lastBit = np.uint64(int(last[0]) % WORD if n else 0)
+   else:
+      rows = np.arange(n)
+      lastWord = last // WORD
+      lastBit = (last % WORD).astype(np.uint64)
+
+   # Vertical deltas, one array per word.
+   Pv = [np.full(n, ALL_ONES) for _ in range(words)]
+   Mv = [np.zeros(n, dtype=np.uint64) for _ in range(words)]
+   # The horizontal delta entering the first block is 0 for a free start, +1 otherwise.
+   hinStart = np.full(n, 0 if freeStart else 1, dtype=np.uint64)
+   noHin = np.zeros(n, dtype=np.uint64)
+   score = lengths.copy()
+   best = lengths.copy()
+   bestEnd = np.zeros(n, dtype=np.int64)
+   history = []
+
+   for j, (Eq, active) in enumerate(steps):
+      PhAll, MhAll = advanceBlocks(Pv, Mv, Eq, hinStart, noHin)
+
+      # Track the distance in the last row of each pattern.
+      if uniform:
+         up = (PhAll[lastWord] >> lastBit) & ONE
+         down = (MhAll[lastWord] >> lastBit) & ONE
+      else:
+         up = (np.stack(PhAll, axis=1)[rows, lastWord] >> lastBit) & ONE
+         down = (np.stack(MhAll, axis=1)[rows, lastWord] >> lastBit) & ONE
+      score += up.view(np.int64)
+      score -= down.view(np.int64)
+
+      improved = score < best
+      if active is not None:
+         improved &= active
+      np.copyto(best, score, where=improved)
+      np.copyto(bestEnd, j + 1, where=improved)
+      if keepAll:
+         history.append(score.copy())
+
+   if keepAll:
+      return best, bestEnd, np.array(history).T.reshape(n, -1)
+   return best, bestEnd
+
+def containedDistances(steps, lengths, words):
+   """
+   " The smallest edit distance between the whole text and any substring of each pattern,
+   " i.e. the same semi-global alignment as editDistances with the roles swapped, but still
+   " walking through the (short) text rather than the (long) patterns: the pattern may be
+   " entered anywhere (zero vertical deltas in the first column) and the distance is the
+   " minimum over the last column, recovered from its vertical deltas at the end.
+   """
+   n = len(lengths)
+   Pv = [np.zeros(n, dtype=np.uint64) for _ in range(words)]
+   Mv = [np.zeros(n, dtype=np.uint64) for _ in range(words)]
+   hinStart = np.ones(n, dtype=np.uint64)
+   noHin = np.zeros(n, dtype=np.uint64)
+   m = 0
+   for Eq, _ in steps:
+      advanceBlocks(Pv, Mv, Eq, hinStart, noHin)
+      m += 1
+
+   # The last column starts at m and changes by the vertical deltas going down.
+   up = np.unpackbits(np.stack(Pv, axis=1).view(np.uint8), axis=1, bitorder="little")
+   down = np.unpackbits(np.stack(Mv, axis=1).view(np.uint8), axis=1, bitorder="little")
+   column = m + np.cumsum(up.astype(np.int32) - down.astype(np.int32), axis=1)
+   column = np.where(np.arange(words * WORD)[None, :] < lengths[:, None], column, m)
+   return np.minimum(column.min(axis=1, initial=m), m)
+
+###################
+# Scoring. #
+###################
+
+def queryRatios(query, candidates):
+   """Scores in [0, 100] from the indel distance, like fuzz.ratio, for a single query."""
+   text = codepoints(query)
+   lengths = candidates.lengths
+   words = numWords(candidates.codes.shape[1])
+   lcs = lcsLengths(yieldCandidateMasks(candidates, text), lengths, words)
+   total = lengths + len(text)
+   scores = np.where(total > 0, 200.0 * lcs / np.maximum(total, 1), 0.0)
+   return np.where((lengths == 0) | (len(text) == 0), 0.0, scores)
+
+def queryPartialRatios(query, candidates):
+   """
+   " Scores in [0, 100] for how well the shorter string of each pair fits somewhere inside the longer,
+   " from the edit distance of the best semi-global alignment, much like fuzz.partial_ratio.
+   """
+   text = codepoints(query)
+   lengths = candidates.lengths
+   distances = np.zeros(len(lengths), dtype=np.int64)
+
+   # Candidates no longer than the query are aligned inside the query...
+   shorter = np.flatnonzero((lengths <= len(text)) & (lengths > 0))
+   if len(shorter):
+      sub = candidates.take(shorter)
+      words = numWords(sub.codes.shape[1])
+      distances[shorter] = editDistances(yieldCandidateMasks(sub, text), sub.lengths, words)[0]
+
+   # ... and the query is aligned inside longer candidates.
+   longer = np.flatnonzero(lengths > len(text))
+   if len(longer) and len(text):
+      sub = candidates.take(longer)
+      words = numWords(sub.codes.shape[1])
+      distances[longer] = containedDistances(yieldCandidateMasks(sub, text), sub.lengths, words)
+
+   shortest = np.minimum(lengths, len(text))
+   scores = 100.0 * (1 - distances / np.maximum(shortest, 1))
+   return np.where(shortest > 0, scores, 0.0)
+
+def scoreMatrix(scorer, queries, candidates):
+   """Apply a one-query scorer to one query (1-D result) or a sequence of queries (2-D result)."""
+   candidates = encode(candidates)
+   if isinstance(queries, str):
+      return scorer(queries, candidates)
+   return np.array([scorer(q, candidates) for q in queries]).reshape(-1, len(candidates))
+
+def ratios(queries, candidates):
+   """Ratio scores of one or many queries against many candidates."""
+   return scoreMatrix(queryRatios, queries, candidates)
+
+def partialRatios(queries, candidates):
+   """Partial ratio scores of one or many queries against many candidates."""
+   return scoreMatrix(queryPartialRatios, queries, candidates)
+
+def combine(scores, weights):
+   """
+   " Combine score arrays in [0, 100] into a single score in [0, 1] by their weighted mean,
+   " e.g. combine([p, q], [1, 0.75]) == (p + 0.75 * q) / 175.
+   """
+   total = sum(w * s for s, w in zip(scores, weights))
+   return total / (100 * sum(weights))
+
+def topK(scores, k, cutoff=None):
+   """
+   " Return the ids and scores of the k best scores (ties broken by id), optionally only those >= cutoff.
+   " A 2-D score matrix gives one (ids, scores) pair per row.
+   """
+   if scores.ndim == 2:
+      return [topK(row, k, cutoff) for row in scores]
+   ids = np.argsort(-scores, kind="stable")[:k]
+   if cutoff is not None:
+      ids = ids[scores[ids] >= cutoff]
+   return ids, scores[ids]
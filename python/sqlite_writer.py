@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Write rows of the file_transcriptions tables in batches: one executemany and one transaction per batch, in WAL mode."""
+
+import time
+import sqlite3
+
+BATCH_SIZE = 1000 # Most rows written in one transaction.
+MAX_DELAY = 1.0 # Seconds a row may wait in the buffer before it is written.
+BUSY_TIMEOUT = 60 # Seconds to wait for another connection to release the database.
+
+# Every column of file_transcriptions, in order. file_path is the key.
+columns = [
+   ("file_path", "text UNIQUE"),
+   ("julius_transcription", "text"),
+   ("best_matches", "text"),
+   ("final_transcription", "text"),
+   ("source_index", "INTEGER")
+]
+
+def createSchema(conn):
+   """Create the file_transcriptions table, adding the columns missing from tables made by older scripts."""
+   conn.execute(
+      "CREATE TABLE IF NOT EXISTS file_transcriptions ({});".format(
+         ", ".join(f"{name} {kind}" for name, kind in columns)
+      )
+   )
+   existing = {row[1] for row in conn.execute("PRAGMA table_info(file_transcriptions);")}
+   for name, kind in columns:
+      if name not in existing:
+         conn.execute(f"ALTER TABLE file_transcriptions ADD COLUMN {name} {kind};")
+   conn.commit()
+
+def connect(dbPath, busyTimeout=BUSY_TIMEOUT):
+   """Open a work's database in WAL mode, so readers don't block the writer, and make sure its table exists."""
+   conn = sqlite3.connect(str(dbPath), timeout=busyTimeout)
+   conn.execute("PRAGMA journal_mode = WAL;")
+   conn.execute("PRAGMA synchronous = NORMAL;")
+   createSchema(conn)
+   return conn
+
+def upsertStatement(values):
+   """
+   " The statement inserting (file_path, *values) rows, or updating the values of the rows already there.
+   " With no values, rows already there are left alone.
+   """
+   names = ["file_path"] + list(values)
+   statement = "INSERT INTO file_transcriptions ({}) VALUES ({}) ON CONFLICT(file_path) DO ".format(
+      ", ".join(names), ", ".join("?" * len(names))
+   )
+   if not values:
+      return statement + "NOTHING;"
+   return statement + "UPDATE SET {};".format(", ".join(f"{v} = excluded.{v}" for v in values))
+
+class BatchWriter:
+   """
+   " Buffer (file_path, *values) rows, values being the given columns, and upsert them with executemany.
+   " The buffer is written, in one transaction, as soon as it holds batchSize rows or its oldest row
+   " has waited maxDelay seconds, and when the writer is flushed, closed or leaves a with block.
+   " The connection stays open; only the writer's own transactions are committed.
+   """
+
+   def __init__(self, conn, values=(), batchSize=BATCH_SIZE, maxDelay=MAX_DELAY):
+      self.conn = conn
+      self.statement = upsertStatement(values)
+      self.batchSize = batchSize
+      self.maxDelay = maxDelay
+      self.buffer = []
+      self.oldest = None # When the first row of the buffer was written.
+      self.written = 0
+
+   def due(self):
+      """Whether the buffer has waited long enough to be written."""
+      return bool(self.buffer) and time.monotonic() - self.oldest >= self.maxDelay
+
+   def write(self, row):
+      if not self.buffer:
+         self.oldest = time.monotonic()
+      self.buffer.append(tuple(row))
+      if len(self.buffer) >= self.batchSize or self.due():
+         self.flush()
+
+   def writeMany(self, rows):
+      for row in rows:
+         self.write(row)
+
+   def flush(self):
+      """Write every buffered row in one transaction."""
+      if not self.buffer:
+         return
+      with self.conn:
+         self.conn.executemany(self.statement, self.buffer)
+      self.written += len(self.buffer)
+      self.buffer = []
+      self.oldest = None
+
+   def close(self):
+      self.flush()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc):
+      self.close()
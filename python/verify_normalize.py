@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+" Check that the fused normalizeSentence gives exactly the same output as the step by step
+" normalization on real text, and that the offsets mode agrees with both.
+" Usage: python verify_normalize.py ../html/kokoro_natume_souseki.html ../data/*/stripped_text/stripped.txt
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from normalize import normalizeSentence, normalizeSentenceStepwise, normalizeSentences
+from segmenter import yieldSentenceSpans
+from benchmark_match import loadSource
+
+def yieldTexts(paths):
+   """Yield every line and every sentence of the given stripped texts or Aozora Bunko HTML files."""
+   for path in map(Path, paths):
+      textPath = loadSource(path)
+      with textPath.open("r") as f:
+         lines = f.read().split("\n")
+      sentences = [s for _, _, s in yieldSentenceSpans(textPath)]
+      if textPath != path:
+         textPath.unlink()
+      yield from lines
+      yield from sentences
+
+def checkOffsets(sentence, expected):
+   """Whether the offsets mode gives the same string, with sources in order and inside the sentence."""
+   normalized, sources = normalizeSentence(sentence, offsets=True)
+   return (
+      normalized == expected and
+      len(sources) == len(normalized) and
+      all(a <= b for a, b in zip(sources, sources[1:])) and
+      all(0 <= s < len(sentence) for s in sources)
+   )
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Compare the fused and step by step normalizations.")
+   parser.add_argument("paths", nargs="+", help="Stripped texts or Aozora Bunko HTML files.")
+   parser.add_argument("-v", "--verbose", action="store_true", help="Print every mismatch.")
+   args = parser.parse_args()
+
+   texts = list(yieldTexts(args.paths))
+
+   t0 = time.perf_counter()
+   reference = [normalizeSentenceStepwise(t) for t in texts]
+   t1 = time.perf_counter()
+   fused = [normalizeSentence(t) for t in texts]
+   t2 = time.perf_counter()
+
+   mismatches = 0
+   if normalizeSentences(texts) != fused:
+      print("Mismatch: normalizeSentences and normalizeSentence disagree.")
+      mismatches += 1
+   for text, expected, got in zip(texts, reference, fused):
+      if got != expected or not checkOffsets(text, expected):
+         mismatches += 1
+         if args.verbose or mismatches <= 5:
+            print("Mismatch:", repr(text), repr(expected), repr(got))
+
+   print("{} strings, {} characters: step by step {:.3f}s, fused {:.3f}s, {} mismatches.".format(
+      len(texts), sum(map(len, texts)), t1 - t0, t2 - t1, mismatches
+   ))
+   sys.exit(1 if mismatches else 0)